@@ -4,6 +4,10 @@ from typing import Dict
 
 from .routes import transactions
 from .routes import stock
+from .routes import alerts
+from .utils.alerts import start_alert_refresher, stop_alert_refresher
+from .utils.replica import replica_if_started
+from .utils.workers import shutdown_executor
 
 app = FastAPI()
 
@@ -17,6 +21,19 @@ app.add_middleware(
 
 app.include_router(transactions.router, prefix="/api/transactions", tags=["transactions"])
 app.include_router(stock.router, prefix="/api/stock", tags=["stocks"])
+app.include_router(alerts.router, prefix="/api/alerts", tags=["alerts"])
+
+@app.on_event("startup")
+def start_background_work() -> None:
+    start_alert_refresher()
+
+@app.on_event("shutdown")
+def stop_background_work() -> None:
+    stop_alert_refresher()
+    shutdown_executor()
+    replica = replica_if_started()
+    if replica is not None:
+        replica.stop()
 
 @app.get("/", summary="Health Check")
 def read_root() -> Dict[str, str]:
@@ -0,0 +1,42 @@
+from fastapi import APIRouter, HTTPException, Query, Security
+from typing import Any, Dict, List, Optional
+
+from ..utils.alerts import get_alert_book
+from ..utils.auth import validate_api_key
+from .models.stock_models import AddAlertRequest
+
+
+router = APIRouter()
+
+
+# === 添加告警 ===
+@router.post("/add", summary="Register a threshold alert", tags=["Alerts"])
+def add_alert(data: AddAlertRequest, api_key=Security(validate_api_key)) -> Dict[str, Any]:
+    """
+    Register an alert such as `rsi < 30` or `close_price crosses boll_upper`.
+
+    Alerts are checked by a background refresh of the symbol's bars and
+    whenever a new technical analysis is computed for it.
+    """
+    try:
+        alert = get_alert_book().add(
+            data.symbol, field=data.field, op=data.op.value,
+            threshold=data.threshold, ref_field=data.ref_field)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "item": alert}
+
+
+# === 获取告警 ===
+@router.get("/list", summary="List registered alerts", tags=["Alerts"])
+def list_alerts(api_key=Security(validate_api_key),
+                symbol: Optional[str] = Query(None, description="Filter by ticker symbol")) -> List[Dict[str, Any]]:
+    return get_alert_book().list(symbol)
+
+
+# === 删除告警 ===
+@router.delete("/{alert_id}", summary="Delete an alert", tags=["Alerts"])
+def delete_alert(alert_id: str, api_key=Security(validate_api_key)) -> Dict[str, bool]:
+    if not get_alert_book().remove(alert_id):
+        raise HTTPException(status_code=404, detail="Alert not found")
+    return {"success": True}
@@ -1,4 +1,5 @@
 from enum import Enum
+from typing import Optional
 
 from pydantic import BaseModel, Field
 
@@ -19,3 +20,19 @@ class AddTransactionRequest(BaseModel):
     currency: Currency
     shares: int
     amount: float
+
+
+class AlertOperator(str, Enum):
+    BELOW = "<"
+    ABOVE = ">"
+    CROSSES = "crosses"
+    CROSSES_ABOVE = "crosses_above"
+    CROSSES_BELOW = "crosses_below"
+
+
+class AddAlertRequest(BaseModel):
+    symbol: str = Field(..., min_length=1, max_length=10)
+    field: str = Field(..., description="Indicator field, e.g. rsi or close_price")
+    op: AlertOperator
+    threshold: Optional[float] = None
+    ref_field: Optional[str] = Field(None, description="Compare against another field, e.g. boll_upper")
@@ -1,12 +1,16 @@
-from fastapi import APIRouter, Query, Security, HTTPException
-from typing import Dict, Any
+from fastapi import APIRouter, Header, Query, Response, Security, HTTPException
+from typing import Dict, Any, Optional
 
-import yfinance as yf
+import pandas as pd
 
+from ..utils.alerts import get_alert_book
+from ..utils.analysis_log import get_analysis_log
 from ..utils.ai import generate_prompt_from_api_response, request_to_groq
-from ..utils.ta import calculate_position, get_exchange_rate, full_tech_analysis, generate_analysis_report, get_upgrade_downgrate
-from ..utils.db import get_finance_transactions
+from ..utils.ta import calculate_position, get_exchange_rate, fetch_analysis_inputs, full_tech_analysis, evaluate_rules, generate_analysis_report, get_upgrade_downgrate, is_default_selection, parse_indicator_selection, required_bars
+from ..utils.db import get_finance_transactions, transactions_version
+from ..utils.snapshots import bar_version, etag_matches, get_snapshot, make_etag, not_modified, put_snapshot
 from ..utils.auth import validate_api_key
+from ..utils.market_data import MarketDataUnavailable, get_scheduler
 
 
 router = APIRouter()
@@ -15,7 +19,9 @@ router = APIRouter()
 # === 获取股票history Data ===
 @router.get("/history/", summary="Get stock price history and analyst rating changes", tags=["Stock"])
 def get_stock(
-    symbol: str = Query(..., description="Stock ticker symbol (e.g., AAPL, TSLA)")
+    response: Response,
+    symbol: str = Query(..., description="Stock ticker symbol (e.g., AAPL, TSLA)"),
+    if_none_match: Optional[str] = Header(None)
 ) -> Dict[str, Any]:
     """
     Fetches 1-month daily historical stock prices and upgrade/downgrade data for a given ticker symbol.
@@ -27,56 +33,124 @@ def get_stock(
         Dict[str, Any]: A dictionary containing analyst upgrade/downgrade info and historical price data.
     """
     try:
-        ticker = yf.Ticker(symbol)
-        df = ticker.history(period="1mo", interval="1d")
+        scheduler = get_scheduler()
+        df = scheduler.history(symbol, period="1mo", interval="1d")
         if df.empty:
             raise ValueError("No historical data found for the symbol.")
 
-        return {
+        etag = make_etag("history", symbol.upper(), bar_version(df))
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        response.headers["ETag"] = etag
+
+        key = f"history:{symbol.upper()}"
+        cached = get_snapshot(key)
+        if cached and cached[0] == etag:
+            return cached[1]
+
+        content = {
             "symbol": symbol.upper(),
             "history": df.reset_index().to_dict(orient="records"),
-            "upgrades_and_downgrades": get_upgrade_downgrate(ticker)
+            "upgrades_and_downgrades": scheduler.call(get_upgrade_downgrate, scheduler.ticker(symbol))
         }
+        put_snapshot(key, etag, content)
+        return content
+
+    except MarketDataUnavailable as e:
+        raise HTTPException(status_code=503, detail=f"Market data temporarily unavailable: {str(e)}")
 
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to fetch stock data: {str(e)}")
 
 
 
+def _symbol_transactions(symbol: str) -> pd.DataFrame:
+    transactions_df = get_finance_transactions()
+    if len(transactions_df) == 0:
+        return pd.DataFrame()
+    return transactions_df[transactions_df["Symbol"].str.upper() == symbol.upper()]
+
+
 # === 单股技术分析 ===
 @router.get("/tech-analysis/", summary="Run technical analysis on a symbol", tags=["Stock"])
-def analyze_symbol(api_key=Security(validate_api_key),
+def analyze_symbol(http_response: Response,
+                   api_key=Security(validate_api_key),
                    symbol: str = Query(..., description="Ticker symbol"),
                    analyse: bool = Query(False, description="Include holding analysis"),
-                   ai: bool = Query(False, description="Include holding analysis")) -> Dict[str, Any]:
+                   ai: bool = Query(False, description="Include holding analysis"),
+                   indicators: Optional[str] = Query(None, description="Comma-separated outputs with optional parameters, e.g. rsi:7,rsi:21,macd,boll (default: all; ignored with ai; advices only with the default set)"),
+                   if_none_match: Optional[str] = Header(None)) -> Dict[str, Any]:
     """
     Returns technical analysis and optional holding metrics for a given symbol.
+
+    The result is versioned by its inputs (latest bar, news ids and, with
+    `analyse`, the symbol's transactions and exchange rate); a matching
+    `If-None-Match` is answered with 304 without recomputing.
+
+    `advices` are only returned for the default indicator set, since the
+    rules need all of its outputs.
     """
-    tech_analysis_indicators, df, news_df = full_tech_analysis(symbol=symbol)
+    try:
+        # AI 提示词需要完整的指标集合
+        selection = parse_indicator_selection(None if ai else indicators)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        df, news_df = fetch_analysis_inputs(symbol)
+        exchange_rate = get_exchange_rate() if analyse else None
+    except MarketDataUnavailable as e:
+        raise HTTPException(status_code=503, detail=f"Market data temporarily unavailable: {str(e)}")
 
     if df.empty:
+        tech_analysis_indicators, _, _ = full_tech_analysis(symbol=symbol, df=df, news_df=news_df)
         raise HTTPException(status_code=400, detail=tech_analysis_indicators)
+    if len(df) < required_bars(selection):
+        raise HTTPException(status_code=400, detail=f"Not enough history for the selected indicators: "
+                                                    f"{len(df)} bar(s), need {required_bars(selection)}")
+
+    symbol_tx = _symbol_transactions(symbol) if analyse else None
+    # 快照日志按输入去重，与响应的 ETag（含持仓、汇率等）无关
+    inputs_version = make_etag(bar_version(df), news_df["id"].tolist())
+    etag = make_etag(
+        "tech-analysis", symbol.upper(), analyse, ai, selection, inputs_version,
+        transactions_version(symbol_tx) if analyse else None,
+        float(exchange_rate) if analyse else None,
+    )
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    http_response.headers["ETag"] = etag
+
+    selection_key = ",".join(name + "".join(f":{v}" for v in params.values()) for name, params in selection)
+    key = f"tech-analysis:{symbol.upper()}:{int(analyse)}:{int(ai)}:{selection_key}"
+    cached = get_snapshot(key)
+    if cached and cached[0] == etag:
+        return cached[1]
+
+    try:
+        tech_analysis_indicators, df, news_df = full_tech_analysis(symbol=symbol, df=df, news_df=news_df, selection=selection)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Cannot compute the selected indicators: {str(e)}")
+    get_alert_book().update(symbol, tech_analysis_indicators)
 
     close_today = df.iloc[-1]["Close"]
     close_prev = df.iloc[-2]["Close"]
     change_pct = (close_today - close_prev) / close_prev * 100
-    exchange_rate = get_exchange_rate()
-    advices = generate_analysis_report(tech_analysis_indicators)
     response = {
         "Symbol": symbol.upper(),
         "Close": float(close_today),
         "PrevClose": float(close_prev),
         "ChangePct": round(change_pct, 2),
-        "advices": advices,
         "tech_analysis_indicators": tech_analysis_indicators,
         "News": news_df.to_dict(orient='records'),
     }
+    if is_default_selection(selection):
+        fired = evaluate_rules(tech_analysis_indicators)
+        response["advices"] = generate_analysis_report(tech_analysis_indicators, fired=fired)
+        get_analysis_log().append(symbol, tech_analysis_indicators, fired, bar_ts=df.index[-1], version=inputs_version)
 
     # If analyse=True and there are matching transactions, compute holding info
     if analyse:
-        transactions_df = get_finance_transactions()
-        symbol_tx = transactions_df[transactions_df["Symbol"].str.upper() == symbol.upper()]
-
         if not symbol_tx.empty:
             holdings = {}
             for currency, sub_df in symbol_tx.groupby("Currency"):
@@ -102,4 +176,36 @@ def analyze_symbol(api_key=Security(validate_api_key),
         response["Question"] = prompt
         response["AI recommandation"] = answer
 
+    put_snapshot(key, etag, response)
     return response
+
+
+# === 历史分析快照 ===
+@router.get("/analysis-history/", summary="Query logged analysis snapshots over time", tags=["Stock"])
+def analysis_history(api_key=Security(validate_api_key),
+                     symbol: str = Query(..., description="Ticker symbol"),
+                     start: Optional[str] = Query(None, description="ISO date/time, default: 90 days before end"),
+                     end: Optional[str] = Query(None, description="ISO date/time, default: now"),
+                     fields: Optional[str] = Query(None, description="Comma-separated fields, e.g. rsi,close_price (default: all)"),
+                     mode: str = Query("series", description="'series' for time series, 'advice' for advice-change events"),
+                     extras: bool = Query(False, description="Include supports/resistances and fibonacci per snapshot")) -> Dict[str, Any]:
+    """
+    Returns previously computed snapshots of a symbol from the analysis log,
+    without recomputing any indicator.
+    """
+    try:
+        end_ts = pd.Timestamp(end) if end else pd.Timestamp.now(tz="UTC")
+        start_ts = pd.Timestamp(start) if start else end_ts - pd.Timedelta(days=90)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid time range: {str(e)}")
+
+    log = get_analysis_log()
+    if mode not in ("series", "advice"):
+        raise HTTPException(status_code=400, detail="mode must be 'series' or 'advice'")
+    try:
+        if mode == "advice":
+            return {"symbol": symbol.upper(), "events": log.advice_changes(symbol, start_ts, end_ts)}
+        field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+        return log.series(symbol, start_ts, end_ts, fields=field_list, include_extras=extras)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -1,9 +1,12 @@
-from fastapi import APIRouter, Security
-import pandas as pd
-from typing import List, Dict, Any
+from fastapi import APIRouter, Header, HTTPException, Query, Response, Security
+from typing import List, Dict, Any, Optional
 
-from ..utils.db import get_finance_transactions, add_transaction
+from ..utils.db import get_finance_transactions, add_transaction, transactions_version
 from ..utils.auth import validate_api_key
+from ..utils.replica import ReplicaNotReady, get_replica, replica_if_started
+from ..utils.snapshots import etag_matches, get_snapshot, make_etag, not_modified, put_snapshot
+from ..utils.ta import aggregate_holdings
+from ..utils.workers import run_cpu_bound
 from .models.stock_models import AddTransactionRequest
 
 
@@ -12,32 +15,27 @@ router = APIRouter()
 
 # === 获取持仓 ===
 @router.get("/holdings", summary="Get current holdings", tags=["Holdings"])
-def get_holdings(api_key=Security(validate_api_key)) -> Dict:
-    """Aggregates current holdings per symbol based on transactions."""
+def get_holdings(response: Response, api_key=Security(validate_api_key),
+                 if_none_match: Optional[str] = Header(None)) -> Dict:
+    """
+    Aggregates current holdings per symbol based on transactions.
+
+    Versioned by a hash of the transactions, so writes from any worker or
+    made directly in DynamoDB change it; a matching `If-None-Match` is
+    answered with 304 and a cached snapshot is reused without re-aggregating.
+    """
     transactions_df = get_finance_transactions()
-    results = []
-
-    for symbol, tx_group in transactions_df.groupby("Symbol"):
-        total_shares = 0
-        invested = 0
-        currency = tx_group["Currency"].iloc[0]
-        print()
-        for operation, ops_df in tx_group.groupby("Operation"):
-            shares = ops_df["Num_of_Shares"].sum()
-            money = ops_df["Amount"].sum()
-            if operation == "BUY":
-                total_shares += shares
-                invested += money
-            else:
-                total_shares -= shares
-                invested -= money
-
-        if total_shares > 0:
-            results.append({"symbol": symbol, "total_shares": int(total_shares), "invested": float(invested), "currency": str(currency)})
-    result_df = pd.DataFrame(results)
-    holdings = {}
-    for currency, holding in result_df.groupby("currency"):
-        holdings[currency] = holding[["symbol", "total_shares", "invested"]].to_dict(orient="records")
+    etag = make_etag("holdings", transactions_version(transactions_df))
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    cached = get_snapshot("holdings")
+    if cached and cached[0] == etag:
+        response.headers["ETag"] = etag
+        return cached[1]
+
+    holdings = run_cpu_bound(aggregate_holdings, transactions_df)
+    put_snapshot("holdings", etag, holdings)
+    response.headers["ETag"] = etag
     return holdings
 
 
@@ -63,4 +61,50 @@ def add_transactions(data: AddTransactionRequest, api_key=Security(validate_api_
     content = {'success': success}
     if success:
         content['item'] = item
-    return content
\ No newline at end of file
+        # 本地副本先行写入，不必等流同步
+        replica = replica_if_started()
+        if replica is not None:
+            replica.upsert(item)
+    return content
+
+
+# === 本地副本查询 ===
+@router.get("/query", summary="Filter transactions from the local replica", tags=["Holdings"])
+def query_transactions(api_key=Security(validate_api_key),
+                       symbol: Optional[str] = Query(None, description="Ticker symbol"),
+                       currency: Optional[str] = Query(None, description="USD or EUR"),
+                       operation: Optional[str] = Query(None, description="BUY or SELL"),
+                       start: Optional[str] = Query(None, description="First date (YYYY-MM-DD), inclusive"),
+                       end: Optional[str] = Query(None, description="Last date (YYYY-MM-DD), inclusive")) -> List[Dict[str, Any]]:
+    """
+    Transactions matching the filters, answered from the indexed local replica
+    instead of scanning DynamoDB.
+    """
+    try:
+        return get_replica().transactions(symbol=symbol, currency=currency, operation=operation, start=start, end=end)
+    except ReplicaNotReady as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@router.get("/aggregate", summary="Aggregate transactions from the local replica", tags=["Holdings"])
+def aggregate_transactions(api_key=Security(validate_api_key),
+                           kind: str = Query(..., description="monthly_invested or turnover_by_symbol"),
+                           symbol: Optional[str] = Query(None, description="Ticker symbol"),
+                           currency: Optional[str] = Query(None, description="USD or EUR"),
+                           start: Optional[str] = Query(None, description="First date (YYYY-MM-DD), inclusive"),
+                           end: Optional[str] = Query(None, description="Last date (YYYY-MM-DD), inclusive")) -> List[Dict[str, Any]]:
+    """
+    Server-side aggregations over the local replica:
+
+    - monthly_invested: bought, sold and net invested per month and currency
+    - turnover_by_symbol: trades, shares traded and turnover per symbol and currency
+    """
+    try:
+        replica = get_replica()
+    except ReplicaNotReady as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if kind == "monthly_invested":
+        return replica.monthly_invested(symbol=symbol, currency=currency, start=start, end=end)
+    if kind == "turnover_by_symbol":
+        return replica.turnover_by_symbol(symbol=symbol, currency=currency, start=start, end=end)
+    raise HTTPException(status_code=400, detail="kind must be 'monthly_invested' or 'turnover_by_symbol'")
\ No newline at end of file
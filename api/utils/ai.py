@@ -5,7 +5,7 @@ from openai import OpenAI
 
 
 client = OpenAI(
-    base_url="https://api.groq.com/openai/v1",
+    base_url=os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1"),
     api_key=os.getenv("GROQ_API")
 )
 
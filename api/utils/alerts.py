@@ -0,0 +1,451 @@
+import os
+import queue
+import bisect
+import logging
+import math
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+
+import requests
+
+from .market_data import BACKGROUND, MarketDataUnavailable, get_scheduler
+from .ta import full_tech_analysis, parse_indicator_selection
+
+logger = logging.getLogger(__name__)
+
+
+ALERT_SINK = os.getenv("ALERT_SINK", "log")
+ALERT_WEBHOOK_URL = os.getenv("ALERT_WEBHOOK_URL")
+ALERTS_PATH = os.getenv("ALERTS_PATH", "data/alerts.sqlite3")
+ALERT_FLUSH_INTERVAL = float(os.getenv("ALERT_FLUSH_INTERVAL", "1"))
+ALERT_QUEUE_SIZE = int(os.getenv("ALERT_QUEUE_SIZE", "1000"))
+# 后台刷新间隔（秒），0 = 只在技术分析请求时检查
+ALERT_REFRESH_INTERVAL = float(os.getenv("ALERT_REFRESH_INTERVAL", "60"))
+
+# tech_analysis_indicators 中可用于告警的数值字段
+ALERT_FIELDS = [
+    "close_price", "rsi", "macd", "macd_signal", "ma5", "ma10", "ma20",
+    "boll_upper", "boll_mid", "boll_lower", "adx", "obv", "atr", "cci",
+]
+# 计算 ALERT_FIELDS 所需的输出
+ALERT_SELECTION = "rsi,macd,ma:5,ma:10,ma:20,boll,adx,obv,atr,cci"
+
+BELOW_OPS = ("<", "crosses_below", "crosses")
+ABOVE_OPS = (">", "crosses_above", "crosses")
+CROSS_OPS = ("crosses_below", "crosses_above", "crosses")
+
+
+# === 通知渠道 ===
+class LogSink:
+    def send(self, event: Dict[str, Any]):
+        logger.info("Alert fired: %s", event)
+
+
+class WebhookSink:
+    def __init__(self, url: str, timeout: float = 5):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, event: Dict[str, Any]):
+        try:
+            requests.post(self.url, json=event, timeout=self.timeout)
+        except requests.RequestException as e:
+            logger.error("Failed to deliver alert %s: %s", event["alert_id"], e)
+
+
+class MemorySink:
+    """Keeps fired events in memory; handy for local runs and the fake-provider setup."""
+
+    def __init__(self):
+        self.events: List[Dict[str, Any]] = []
+
+    def send(self, event: Dict[str, Any]):
+        self.events.append(event)
+
+
+class QueuedSink:
+    """Hands events to a worker thread so slow deliveries (webhooks) never block the caller."""
+
+    def __init__(self, sink, maxsize: int = ALERT_QUEUE_SIZE):
+        self.sink = sink
+        self._queue = queue.Queue(maxsize)
+        self._thread = threading.Thread(target=self._run, name="alert-delivery", daemon=True)
+        self._thread.start()
+
+    def send(self, event: Dict[str, Any]):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            logger.error("Alert queue is full, dropping alert %s", event["alert_id"])
+
+    def _run(self):
+        while True:
+            event = self._queue.get()
+            try:
+                self.sink.send(event)
+            except Exception as e:
+                logger.error("Failed to deliver alert %s: %s", event["alert_id"], e)
+
+
+# === 持久化 ===
+ALERTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS alerts (
+    id TEXT PRIMARY KEY,
+    symbol TEXT NOT NULL,
+    field TEXT NOT NULL,
+    op TEXT NOT NULL,
+    threshold REAL NOT NULL,
+    ref_field TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS last_values (
+    symbol TEXT NOT NULL,
+    field TEXT NOT NULL,
+    ref_field TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (symbol, field, ref_field)
+);
+"""
+
+
+class AlertStore:
+    """
+    SQLite persistence for an AlertBook: one row per alert and per last value.
+
+    Alert rows are written as they change (add/remove are rare). Last values
+    are buffered and flushed by a background thread, so `update` never waits
+    on disk. Rows are written individually, so several workers can share
+    one file without overwriting each other's alerts.
+    """
+
+    def __init__(self, path: str = ALERTS_PATH, flush_interval: float = ALERT_FLUSH_INTERVAL):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(ALERTS_SCHEMA)
+        self._lock = threading.Lock()
+        self._pending: Dict[tuple, float] = {}
+        self._pending_lock = threading.Lock()
+        self.flush_interval = flush_interval
+        self._thread = threading.Thread(target=self._run, name="alert-store", daemon=True)
+        self._thread.start()
+
+    def alerts(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM alerts ORDER BY created_at, id").fetchall()
+        return [{**dict(row), "ref_field": row["ref_field"] or None} for row in rows]
+
+    def save_alert(self, alert: Dict[str, Any]):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO alerts (id, symbol, field, op, threshold, ref_field, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (alert["id"], alert["symbol"], alert["field"], alert["op"], alert["threshold"],
+                 alert["ref_field"] or "", alert["created_at"]))
+
+    def delete_alert(self, alert_id: str) -> bool:
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM alerts WHERE id = ?", (alert_id,)).rowcount > 0
+
+    def last_values(self) -> Dict[str, Dict[tuple, float]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM last_values").fetchall()
+        last = {}
+        for row in rows:
+            last.setdefault(row["symbol"], {})[(row["field"], row["ref_field"] or None)] = row["value"]
+        return last
+
+    def save_last(self, symbol: str, key: tuple, value: float):
+        """Buffer a last value; written by the next flush."""
+        with self._pending_lock:
+            self._pending[(symbol, key[0], key[1] or "")] = value
+
+    def flush(self):
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO last_values (symbol, field, ref_field, value) VALUES (?, ?, ?, ?)",
+                [(*key, value) for key, value in pending.items()])
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                logger.error("Failed to persist alert state: %s", e)
+
+
+# === 告警索引 ===
+class _FieldIndex:
+    """
+    Alerts of one (symbol, field, ref_field) sorted by threshold.
+
+    `below` holds alerts that fire when the value drops under their threshold,
+    `above` those that fire when it rises over it. A move from `prev` to
+    `value` only touches the slice of thresholds lying between the two.
+    """
+
+    def __init__(self):
+        self.below = []  # [(threshold, alert_id)]
+        self.above = []
+
+    def add(self, alert: Dict[str, Any]):
+        entry = (alert["threshold"], alert["id"])
+        if alert["op"] in BELOW_OPS:
+            bisect.insort(self.below, entry)
+        if alert["op"] in ABOVE_OPS:
+            bisect.insort(self.above, entry)
+
+    def remove(self, alert: Dict[str, Any]):
+        entry = (alert["threshold"], alert["id"])
+        for side in (self.below, self.above):
+            i = bisect.bisect_left(side, entry)
+            if i < len(side) and side[i] == entry:
+                side.pop(i)
+
+    def __len__(self):
+        return len(self.below) + len(self.above)
+
+    def crossed(self, prev: Optional[float], value: float) -> List[str]:
+        # 下穿：threshold ∈ (value, prev]
+        lo = bisect.bisect_right(self.below, value, key=lambda e: e[0])
+        hi = len(self.below) if prev is None else bisect.bisect_right(self.below, prev, key=lambda e: e[0])
+        ids = [alert_id for _, alert_id in self.below[lo:hi]]
+        # 上穿：threshold ∈ [prev, value)
+        lo = 0 if prev is None else bisect.bisect_left(self.above, prev, key=lambda e: e[0])
+        hi = bisect.bisect_left(self.above, value, key=lambda e: e[0])
+        ids.extend(alert_id for _, alert_id in self.above[lo:hi])
+        return ids
+
+
+class AlertBook:
+    """
+    Threshold alerts indexed per symbol and field.
+
+    Alerts are edge-triggered: they fire when an indicator update moves the
+    value across the threshold. "<" / ">" alerts also fire on the first value
+    seen for their field if it already satisfies the condition; "crosses*"
+    alerts need a previous value. Comparing against another field
+    (e.g. close_price crosses boll_upper) indexes the spread with threshold 0.
+
+    With a `store` the alerts and the last value seen per field survive a
+    restart, so alerts are neither lost nor fired again; `sync` picks up
+    alerts added or removed by other workers sharing the store.
+    """
+
+    def __init__(self, sink=None, store: Optional[AlertStore] = None):
+        self.sink = sink or LogSink()
+        self.store = store
+        self._alerts: Dict[str, Dict[str, Any]] = {}
+        self._index: Dict[str, Dict[tuple, _FieldIndex]] = {}
+        self._last: Dict[str, Dict[tuple, float]] = {}
+        self._lock = threading.Lock()
+        if store is not None:
+            self._last = store.last_values()
+            self.sync()
+
+    def _index_alert(self, alert: Dict[str, Any]):
+        self._alerts[alert["id"]] = alert
+        key = (alert["field"], alert["ref_field"])
+        self._index.setdefault(alert["symbol"], {}).setdefault(key, _FieldIndex()).add(alert)
+
+    def _unindex_alert(self, alert_id: str) -> bool:
+        alert = self._alerts.pop(alert_id, None)
+        if alert is None:
+            return False
+        fields = self._index[alert["symbol"]]
+        key = (alert["field"], alert["ref_field"])
+        fields[key].remove(alert)
+        if not len(fields[key]):
+            del fields[key]
+        return True
+
+    def sync(self):
+        """Reconcile the in-memory index with the alert rows in the store."""
+        if self.store is None:
+            return
+        stored = {alert["id"]: alert for alert in self.store.alerts()}
+        with self._lock:
+            for alert_id in [i for i in self._alerts if i not in stored]:
+                self._unindex_alert(alert_id)
+            for alert_id, alert in stored.items():
+                if alert_id not in self._alerts:
+                    self._index_alert(alert)
+
+    def add(self, symbol: str, field: str, op: str, threshold: Optional[float] = None,
+            ref_field: Optional[str] = None) -> Dict[str, Any]:
+        if field not in ALERT_FIELDS or (ref_field and ref_field not in ALERT_FIELDS):
+            raise ValueError(f"Unsupported field, expected one of {ALERT_FIELDS}")
+        if (threshold is None) == (ref_field is None):
+            raise ValueError("Provide exactly one of threshold or ref_field")
+
+        alert = {
+            "id": uuid4().hex[:12],
+            "symbol": symbol.upper(),
+            "field": field,
+            "op": op,
+            "threshold": 0.0 if ref_field else float(threshold),
+            "ref_field": ref_field,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+        if self.store is not None:
+            self.store.save_alert(alert)
+        with self._lock:
+            self._index_alert(alert)
+        return alert
+
+    def remove(self, alert_id: str) -> bool:
+        # 告警可能由其他 worker 添加，以存储中的记录为准
+        deleted = self.store.delete_alert(alert_id) if self.store is not None else False
+        with self._lock:
+            return self._unindex_alert(alert_id) or deleted
+
+    def list(self, symbol: Optional[str] = None) -> List[Dict[str, Any]]:
+        if self.store is not None:
+            alerts = self.store.alerts()
+        else:
+            with self._lock:
+                alerts = list(self._alerts.values())
+        if symbol:
+            alerts = [a for a in alerts if a["symbol"] == symbol.upper()]
+        return alerts
+
+    def symbols(self) -> List[str]:
+        with self._lock:
+            return [symbol for symbol, fields in self._index.items() if fields]
+
+    def update(self, symbol: str, indicators: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Feed the latest indicators of `symbol`; fires and returns the crossed alerts."""
+        symbol = symbol.upper()
+        events = []
+        with self._lock:
+            fields = self._index.get(symbol, {})
+            last = self._last.setdefault(symbol, {})
+            for key, index in fields.items():
+                field, ref_field = key
+                value = _as_float(indicators.get(field))
+                if ref_field:
+                    ref = _as_float(indicators.get(ref_field))
+                    value = None if value is None or ref is None else value - ref
+                if value is None:
+                    continue
+                prev = last.get(key)
+                if prev == value:
+                    continue
+                last[key] = value
+                if self.store is not None:
+                    self.store.save_last(symbol, key, value)
+                for alert_id in index.crossed(prev, value):
+                    alert = self._alerts[alert_id]
+                    if prev is None and alert["op"] in CROSS_OPS:
+                        continue
+                    events.append(_event(alert, prev, value))
+        for event in events:
+            self.sink.send(event)
+        return events
+
+
+def _as_float(value) -> Optional[float]:
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else value
+
+
+def _event(alert: Dict[str, Any], prev: Optional[float], value: float) -> Dict[str, Any]:
+    return {
+        "alert_id": alert["id"],
+        "symbol": alert["symbol"],
+        "field": alert["field"],
+        "op": alert["op"],
+        "threshold": alert["threshold"],
+        "ref_field": alert["ref_field"],
+        "previous": prev,
+        "value": value,
+        "fired_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+# === 后台刷新 ===
+class AlertRefresher:
+    """
+    Periodically fetches the bars of every symbol with alerts at BACKGROUND
+    priority and feeds the indicators to the book, so alerts fire without
+    anyone requesting the analysis.
+    """
+
+    def __init__(self, book: AlertBook, interval: float = ALERT_REFRESH_INTERVAL):
+        self.book = book
+        self.interval = interval
+        self.selection = parse_indicator_selection(ALERT_SELECTION)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="alert-refresher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.book.sync()
+            except sqlite3.Error as e:
+                logger.error("Alert sync failed: %s", e)
+            for symbol in self.book.symbols():
+                try:
+                    self.refresh(symbol)
+                except MarketDataUnavailable as e:
+                    logger.warning("Alert refresh of %s skipped: %s", symbol, e)
+                except Exception as e:
+                    logger.error("Alert refresh of %s failed: %s", symbol, e)
+
+    def refresh(self, symbol: str) -> List[Dict[str, Any]]:
+        # 与技术分析相同的 (period, interval)，可与交互请求合并
+        df = get_scheduler().history(symbol, period="6mo", interval="1d", priority=BACKGROUND)
+        if df.empty:
+            return []
+        indicators, _, _ = full_tech_analysis(symbol, df=df, selection=self.selection)
+        return self.book.update(symbol, indicators)
+
+
+_book: Optional[AlertBook] = None
+_book_lock = threading.Lock()
+_refresher: Optional[AlertRefresher] = None
+
+
+def get_alert_book() -> AlertBook:
+    global _book
+    with _book_lock:
+        if _book is None:
+            sink = WebhookSink(ALERT_WEBHOOK_URL) if ALERT_SINK == "webhook" and ALERT_WEBHOOK_URL else LogSink()
+            _book = AlertBook(QueuedSink(sink), store=AlertStore(ALERTS_PATH))
+        return _book
+
+
+def start_alert_refresher():
+    global _refresher
+    if ALERT_REFRESH_INTERVAL > 0 and _refresher is None:
+        _refresher = AlertRefresher(get_alert_book())
+        _refresher.start()
+
+
+def stop_alert_refresher():
+    if _refresher is not None:
+        _refresher.stop()
+    if _book is not None and _book.store is not None:
+        _book.store.flush()
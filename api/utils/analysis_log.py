@@ -0,0 +1,220 @@
+import os
+import re
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .advice_config import rules
+
+
+ANALYSIS_LOG_DIR = os.getenv("ANALYSIS_LOG_DIR", "data/analysis_log")
+
+# 列文件：每个数值字段一个定长二进制文件，按行追加
+TS_COLUMN = "ts.i64"
+BAR_TS_COLUMN = "bar_ts.i64"
+RULES_COLUMN = "rules.i64"
+EXTRAS_FILE = "extras.jsonl"
+RULE_NAMES_FILE = "rules.json"
+
+# 非数值字段（列表 / 字典）逐行存入 extras.jsonl
+EXTRA_FIELDS = ["local_supports", "local_resistances", "volumn_supports", "volumn_resistances", "fibonacci"]
+
+# 代码和字段名会成为路径的一部分，只允许安全字符
+SYMBOL_PATTERN = re.compile(r"^[A-Z0-9][A-Z0-9.=^-]{0,14}$")
+FIELD_PATTERN = re.compile(r"^[a-z][a-z0-9_.]{0,63}$")
+
+
+def _check_symbol(symbol: str) -> str:
+    symbol = symbol.upper()
+    if not SYMBOL_PATTERN.match(symbol):
+        raise ValueError(f"Invalid symbol '{symbol}'")
+    return symbol
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, bool)
+
+
+def _to_ns(value) -> int:
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize("UTC")
+    return ts.value
+
+
+class AnalysisLog:
+    """
+    Append-only columnar log of analysis snapshots, partitioned as
+    `<root>/<SYMBOL>/<YYYY-MM-DD>/`.
+
+    Each partition holds one fixed-width binary file per numeric field
+    (`rsi.f64`, ...) plus `ts.i64` (snapshot time), `bar_ts.i64` (latest bar)
+    and `rules.i64` (bitmask of fired rules, decoded with the partition's
+    `rules.json`). Lists such as supports/resistances go to `extras.jsonl`.
+    Time-range queries binary-search `ts.i64` instead of recomputing.
+    """
+
+    def __init__(self, root: str = ANALYSIS_LOG_DIR):
+        self.root = Path(root)
+        self._lock = threading.Lock()
+        self._last_version: Dict[str, str] = {}
+
+    # --- 写入 ---
+    def append(self, symbol: str, indicators: Dict[str, Any], fired: List[int],
+               bar_ts=None, version: Optional[str] = None, ts=None) -> bool:
+        """
+        Append one snapshot; skipped when `version` (a version of the inputs:
+        bars and news) equals the last one logged for the symbol.
+
+        `ts` defaults to now and is clamped to the partition's last timestamp,
+        so `ts.i64` stays sorted for the binary search.
+        """
+        symbol = _check_symbol(symbol)
+        numeric = {k: float(v) for k, v in indicators.items() if _is_number(v) and FIELD_PATTERN.match(k)}
+        extras = {k: indicators[k] for k in EXTRA_FIELDS if k in indicators}
+        mask = 0
+        for i in fired:
+            mask |= 1 << i
+
+        with self._lock:
+            if version is not None and self._last_version.get(symbol) == version:
+                return False
+            # 在锁内取时间：并发追加时保证写入顺序与时间顺序一致
+            ts_ns = _to_ns(ts if ts is not None else pd.Timestamp.now(tz="UTC"))
+            partition = self.root / symbol / pd.Timestamp(ts_ns, tz="UTC").strftime("%Y-%m-%d")
+            partition.mkdir(parents=True, exist_ok=True)
+            ts_ns = max(ts_ns, self._last_ts(partition))
+            rule_names = partition / RULE_NAMES_FILE
+            if not rule_names.exists():
+                rule_names.write_text(json.dumps([r["name"] for r in rules], ensure_ascii=False), encoding="utf-8")
+
+            rows = self._row_count(partition)
+            existing = {p.name[:-4] for p in partition.glob("*.f64")}
+            for field in existing | set(numeric):
+                path = partition / f"{field}.f64"
+                with open(path, "ab") as f:
+                    if field not in existing and rows:
+                        # 新出现的字段：为已有行补 NaN，保持各列对齐
+                        np.full(rows, np.nan, dtype="<f8").tofile(f)
+                    np.array([numeric.get(field, np.nan)], dtype="<f8").tofile(f)
+            with open(partition / EXTRAS_FILE, "a", encoding="utf-8") as f:
+                f.write(json.dumps(extras, default=float, ensure_ascii=False) + "\n")
+            bar_ns = _to_ns(bar_ts) if bar_ts is not None else np.iinfo(np.int64).min
+            self._append_i64(partition / BAR_TS_COLUMN, bar_ns)
+            self._append_i64(partition / RULES_COLUMN, mask)
+            # 时间列最后写入：它决定分区的行数
+            self._append_i64(partition / TS_COLUMN, ts_ns)
+
+            if version is not None:
+                self._last_version[symbol] = version
+        return True
+
+    @staticmethod
+    def _append_i64(path: Path, value: int):
+        with open(path, "ab") as f:
+            np.array([value], dtype="<i8").tofile(f)
+
+    @classmethod
+    def _last_ts(cls, partition: Path) -> int:
+        rows = cls._row_count(partition)
+        if not rows:
+            return np.iinfo(np.int64).min
+        return int(np.fromfile(partition / TS_COLUMN, dtype="<i8", count=1, offset=(rows - 1) * 8)[0])
+
+    @staticmethod
+    def _row_count(partition: Path) -> int:
+        path = partition / TS_COLUMN
+        return path.stat().st_size // 8 if path.exists() else 0
+
+    # --- 查询 ---
+    def _partitions(self, symbol: str, start_ns: int, end_ns: int) -> List[Path]:
+        base = self.root / _check_symbol(symbol)
+        if not base.exists():
+            return []
+        first = pd.Timestamp(start_ns, tz="UTC").strftime("%Y-%m-%d")
+        last = pd.Timestamp(end_ns, tz="UTC").strftime("%Y-%m-%d")
+        return sorted(p for p in base.iterdir() if p.is_dir() and first <= p.name <= last)
+
+    def _scan(self, symbol: str, start, end):
+        """Yield (partition, lo, hi, ts) with rows lo:hi of each partition inside [start, end]."""
+        start_ns, end_ns = _to_ns(start), _to_ns(end)
+        for partition in self._partitions(symbol, start_ns, end_ns):
+            rows = self._row_count(partition)
+            ts = np.fromfile(partition / TS_COLUMN, dtype="<i8", count=rows)
+            lo = int(np.searchsorted(ts, start_ns, side="left"))
+            hi = int(np.searchsorted(ts, end_ns, side="right"))
+            if lo < hi:
+                yield partition, lo, hi, ts[lo:hi]
+
+    @staticmethod
+    def _read_column(path: Path, dtype: str, lo: int, hi: int) -> np.ndarray:
+        if not path.exists():
+            return np.full(hi - lo, np.nan)
+        return np.fromfile(path, dtype=dtype, count=hi - lo, offset=lo * 8)
+
+    def series(self, symbol: str, start, end, fields: Optional[List[str]] = None,
+               include_extras: bool = False) -> Dict[str, Any]:
+        """Raises ValueError on invalid symbols and on fields that were never logged in the range."""
+        for name in fields or []:
+            if not FIELD_PATTERN.match(name):
+                raise ValueError(f"Invalid field '{name}'")
+        timestamps, columns, extras, logged = [], {}, [], set()
+        for partition, lo, hi, ts in self._scan(symbol, start, end):
+            available = sorted(p.name[:-4] for p in partition.glob("*.f64"))
+            logged.update(available)
+            for name in fields or available:
+                # 之前分区中没有的字段用 NaN 补齐
+                columns.setdefault(name, [np.nan] * len(timestamps))
+            for name in columns:
+                columns[name].extend(self._read_column(partition / f"{name}.f64", "<f8", lo, hi).tolist())
+            timestamps.extend(ts.tolist())
+            if include_extras:
+                with open(partition / EXTRAS_FILE, encoding="utf-8") as f:
+                    lines = f.readlines()[lo:hi]
+                extras.extend(json.loads(line) for line in lines)
+        unknown = [name for name in fields or [] if name not in logged]
+        if timestamps and unknown:
+            raise ValueError(f"Unknown field(s) {unknown}, expected some of {sorted(logged)}")
+
+        result = {
+            "symbol": symbol.upper(),
+            "timestamps": [pd.Timestamp(t, tz="UTC").isoformat() for t in timestamps],
+            "series": {name: [None if np.isnan(v) else v for v in values] for name, values in columns.items()},
+        }
+        if include_extras:
+            result["extras"] = extras
+        return result
+
+    def advice_changes(self, symbol: str, start, end) -> List[Dict[str, Any]]:
+        """Snapshots whose set of fired rules differs from the previous one (the first is the baseline)."""
+        events = []
+        prev_mask, prev_names = None, []
+        for partition, lo, hi, ts in self._scan(symbol, start, end):
+            names = json.loads((partition / RULE_NAMES_FILE).read_text(encoding="utf-8"))
+            masks = np.fromfile(partition / RULES_COLUMN, dtype="<i8", count=hi - lo, offset=lo * 8)
+            for t, mask in zip(ts.tolist(), masks.tolist()):
+                if mask == prev_mask:
+                    continue
+                fired = [names[i] for i in range(len(names)) if mask >> i & 1]
+                events.append({
+                    "timestamp": pd.Timestamp(t, tz="UTC").isoformat(),
+                    "rules": fired,
+                    "added": [n for n in fired if n not in prev_names],
+                    "removed": [n for n in prev_names if n not in fired],
+                })
+                prev_mask, prev_names = mask, fired
+        return events
+
+
+_log: Optional[AnalysisLog] = None
+
+
+def get_analysis_log() -> AnalysisLog:
+    global _log
+    if _log is None:
+        _log = AnalysisLog()
+    return _log
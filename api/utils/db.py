@@ -1,4 +1,6 @@
 import os
+import json
+import hashlib
 
 from datetime import datetime
 from decimal import Decimal
@@ -18,6 +20,29 @@ logger = logging.getLogger(__name__)
 
 AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
+# 指向本地 DynamoDB 兼容服务（DynamoDB Local / moto），为空时使用 AWS
+DYNAMODB_ENDPOINT_URL = os.getenv("DYNAMODB_ENDPOINT_URL")
+
+def transactions_version(transactions_df: pd.DataFrame) -> str:
+    """
+    Content hash of a set of transactions, used for ETags. Derived from the
+    data, so it also changes for writes made by other workers or directly in
+    DynamoDB.
+    """
+    if len(transactions_df) == 0:
+        return "empty"
+    columns = ["id", "Symbol", "Operation", "Num_of_Shares", "Amount", "Currency"]
+    rows = transactions_df[columns].astype(str).sort_values("id").values.tolist()
+    return hashlib.sha1(json.dumps(rows).encode("utf-8")).hexdigest()[:16]
+
+
+def get_transactions_table():
+    dynamodb = boto3.resource('dynamodb',
+                              aws_access_key_id=AWS_ACCESS_KEY_ID,
+                              aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+                              region_name='eu-north-1',
+                              endpoint_url=DYNAMODB_ENDPOINT_URL)
+    return dynamodb.Table('transactions_table')
 
 
 def add_transaction(
@@ -39,11 +64,7 @@ def add_transaction(
 
     try:
         # Initialize DynamoDB (credentials loaded from environment or ~/.aws/credentials)
-        dynamodb = boto3.resource('dynamodb',
-                                  aws_access_key_id=AWS_ACCESS_KEY_ID, 
-                                  aws_secret_access_key=AWS_SECRET_ACCESS_KEY, 
-                                  region_name='eu-north-1')
-        table = dynamodb.Table('transactions_table')
+        table = get_transactions_table()
 
         # Generate item
         date = datetime.today().strftime('%Y-%m-%d')
@@ -83,11 +104,7 @@ def get_finance_transactions(symbol: Optional[str] = None) -> List[Dict]:
     Returns:
         List[Dict]: List of transaction items.
     """
-    dynamodb = boto3.resource('dynamodb',
-                          aws_access_key_id=AWS_ACCESS_KEY_ID, 
-                          aws_secret_access_key=AWS_SECRET_ACCESS_KEY, 
-                          region_name='eu-north-1')
-    table = dynamodb.Table('transactions_table')
+    table = get_transactions_table()
 
     try:
         items = []
@@ -0,0 +1,373 @@
+import os
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from yfinance.exceptions import YFException, YFRateLimitError
+
+logger = logging.getLogger(__name__)
+
+
+MARKET_DATA_PROVIDER = os.getenv("MARKET_DATA_PROVIDER", "yahoo")
+MARKET_DATA_RATE = float(os.getenv("MARKET_DATA_RATE", "2"))              # 每秒请求数
+MARKET_DATA_BURST = int(os.getenv("MARKET_DATA_BURST", "5"))
+MARKET_DATA_BACKGROUND_RESERVE = int(os.getenv("MARKET_DATA_BACKGROUND_RESERVE", "2"))
+MARKET_DATA_BATCH_WINDOW = float(os.getenv("MARKET_DATA_BATCH_WINDOW", "0.05"))
+MARKET_DATA_MAX_BATCH = int(os.getenv("MARKET_DATA_MAX_BATCH", "20"))
+MARKET_DATA_MAX_INFLIGHT = int(os.getenv("MARKET_DATA_MAX_INFLIGHT", "2"))
+MARKET_DATA_MAX_RETRIES = int(os.getenv("MARKET_DATA_MAX_RETRIES", "4"))
+MARKET_DATA_BACKOFF = float(os.getenv("MARKET_DATA_BACKOFF", "0.5"))
+MARKET_DATA_TIMEOUT = float(os.getenv("MARKET_DATA_TIMEOUT", "30"))
+
+INTERACTIVE = 0
+BACKGROUND = 1
+
+
+class MarketDataUnavailable(Exception):
+    """Raised when the provider keeps failing after all retries."""
+
+
+class ThrottledError(Exception):
+    """Raised by a provider when the upstream rate limit is hit."""
+
+
+# 只重试限流与网络错误（requests / curl_cffi 的异常都是 OSError 子类），其他异常原样抛出；
+# news / recommendations 等属性访问遇到 429 时 yfinance 直接抛出 YFRateLimitError
+RETRYABLE_ERRORS = (ThrottledError, YFRateLimitError, OSError)
+
+
+# === 数据源 ===
+class YahooProvider:
+    """
+    History downloads for a batch of symbols. Yahoo has no multi-ticker chart
+    endpoint, so this is one `Ticker.history` request per symbol; frames are
+    yielded as (symbol, frame) in the order of `symbols` as they arrive.
+    """
+
+    def download(self, symbols: List[str], period: str, interval: str) -> Iterator[Tuple[str, pd.DataFrame]]:
+        for symbol in symbols:
+            try:
+                # yf.download 会把每个 ticker 的异常吞进 yfinance.shared._ERRORS，这里直接让异常抛出
+                frame = yf.Ticker(symbol).history(
+                    period=period, interval=interval, auto_adjust=True, actions=True, raise_errors=True)
+            except YFRateLimitError as e:
+                raise ThrottledError(str(e)) from e
+            except YFException as e:
+                # 无效或已退市的代码：与之前一样返回空数据
+                logger.warning("No history for %s: %s", symbol, e)
+                frame = pd.DataFrame()
+            yield symbol, frame
+
+    def ticker(self, symbol: str):
+        return yf.Ticker(symbol)
+
+
+class FakeProvider:
+    """
+    Local stand-in for Yahoo: deterministic synthetic daily bars per symbol and a
+    sliding-window limit that raises ThrottledError like the real service does.
+    """
+
+    PERIOD_BARS = {"1d": 1, "5d": 5, "1mo": 21, "3mo": 63, "6mo": 126, "1y": 252}
+
+    def __init__(self, max_calls: int = 10, window: float = 1.0, latency: float = 0.0):
+        self.max_calls = max_calls
+        self.window = window
+        self.latency = latency
+        self.calls: List[List[str]] = []
+        self._call_times: List[float] = []
+        self._lock = threading.Lock()
+
+    def _check_throttle(self, cost: int = 1):
+        now = time.monotonic()
+        with self._lock:
+            self._call_times = [t for t in self._call_times if now - t < self.window]
+            if len(self._call_times) + cost > self.max_calls:
+                raise ThrottledError("Too Many Requests. Rate limited.")
+            self._call_times.extend([now] * cost)
+
+    def download(self, symbols: List[str], period: str, interval: str) -> Iterator[Tuple[str, pd.DataFrame]]:
+        with self._lock:
+            self.calls.append(list(symbols))
+        bars = self.PERIOD_BARS.get(period, 126)
+        for symbol in symbols:
+            # 与 Yahoo 一致：每个代码一次请求
+            self._check_throttle()
+            if self.latency:
+                time.sleep(self.latency)
+            yield symbol, synthetic_history(symbol, bars)
+
+    def ticker(self, symbol: str):
+        return FakeTicker(symbol, self)
+
+
+class FakeTicker:
+    """The subset of `yf.Ticker` the analysis uses besides history: news and recommendations."""
+
+    def __init__(self, symbol: str, provider: FakeProvider):
+        self.symbol = symbol.upper()
+        self.provider = provider
+
+    @property
+    def news(self) -> List[Dict]:
+        self.provider._check_throttle()
+        return [{
+            "id": f"{self.symbol}-news-{i}",
+            "content": {
+                "contentType": "STORY",
+                "title": f"{self.symbol} headline {i}",
+                "summary": f"{self.symbol} shares moved after a routine update {i}.",
+                "provider": {"displayName": "Fake Wire"},
+            },
+        } for i in range(5)]
+
+    @property
+    def recommendations(self) -> pd.DataFrame:
+        self.provider._check_throttle()
+        return pd.DataFrame({
+            "period": ["0m", "-1m", "-2m", "-3m"],
+            "strongBuy": [5, 5, 4, 4], "buy": [10, 9, 9, 8], "hold": [8, 8, 9, 10],
+            "sell": [1, 1, 1, 1], "strongSell": [0, 0, 1, 1],
+        })
+
+
+def synthetic_history(symbol: str, bars: int) -> pd.DataFrame:
+    rng = np.random.default_rng(zlib.crc32(symbol.encode("utf-8")))
+    index = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=bars, name="Date")
+    close = np.maximum(100 + np.cumsum(rng.normal(0, 1.5, bars)), 1.0)
+    spread = np.abs(rng.normal(0, 1.0, bars))
+    return pd.DataFrame({
+        "Open": close + rng.normal(0, 0.5, bars),
+        "High": close + spread,
+        "Low": close - spread,
+        "Close": close,
+        "Volume": rng.integers(1_000_000, 5_000_000, bars).astype(float),
+        "Dividends": 0.0,
+        "Stock Splits": 0.0,
+    }, index=index)
+
+
+# === 令牌桶 ===
+class TokenBucket:
+    """
+    Request-rate budget. Background callers only take a token while more than
+    `reserve` tokens are left, so interactive requests are served first.
+    """
+
+    def __init__(self, rate: float, burst: int, reserve: int = 0):
+        self.rate = rate
+        self.burst = burst
+        self.reserve = min(reserve, burst - 1)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, priority: int = INTERACTIVE):
+        needed = 1 + (self.reserve if priority == BACKGROUND else 0)
+        with self._cond:
+            while True:
+                self._refill()
+                if self.tokens >= needed:
+                    self.tokens -= 1
+                    return
+                self._cond.wait((needed - self.tokens) / self.rate)
+
+
+# === 调度器 ===
+class _Pending:
+    def __init__(self, symbol: str, period: str, interval: str, priority: int):
+        self.symbol = symbol
+        self.period = period
+        self.interval = interval
+        self.priority = priority
+        self.future = Future()
+
+
+class FetchScheduler:
+    """
+    Central entry point for market data fetches.
+
+    History requests are queued by priority, coalesced by (period, interval)
+    into batches, and sent under a token bucket budget (one token per symbol,
+    since the provider makes one request per symbol) with exponential backoff
+    and jitter on throttling or transport errors. Identical pending requests
+    share one fetch; `history` hands every caller its own copy of the frame.
+    """
+
+    def __init__(self, provider, rate: float = MARKET_DATA_RATE, burst: int = MARKET_DATA_BURST,
+                 reserve: int = MARKET_DATA_BACKGROUND_RESERVE, batch_window: float = MARKET_DATA_BATCH_WINDOW,
+                 max_batch: int = MARKET_DATA_MAX_BATCH, max_inflight: int = MARKET_DATA_MAX_INFLIGHT,
+                 max_retries: int = MARKET_DATA_MAX_RETRIES, backoff: float = MARKET_DATA_BACKOFF):
+        self.provider = provider
+        self.bucket = TokenBucket(rate, burst, reserve)
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._queue = []
+        self._pending: Dict[tuple, _Pending] = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._slots = threading.Semaphore(max_inflight)
+        self._executor = ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="market-data")
+        self._dispatcher = None
+
+    # --- 对外接口 ---
+    def history(self, symbol: str, period: str = "6mo", interval: str = "1d",
+                priority: int = INTERACTIVE, timeout: float = MARKET_DATA_TIMEOUT) -> pd.DataFrame:
+        try:
+            frame = self.submit(symbol, period, interval, priority).result(timeout=timeout)
+        except FutureTimeout as e:
+            raise MarketDataUnavailable(f"Timed out fetching {symbol} history") from e
+        # 合并的请求共享同一个 future，每个调用方拿到自己的副本
+        return frame.copy()
+
+    def submit(self, symbol: str, period: str = "6mo", interval: str = "1d",
+               priority: int = INTERACTIVE) -> Future:
+        symbol = symbol.upper()
+        key = (symbol, period, interval)
+        with self._cond:
+            self._ensure_dispatcher()
+            pending = self._pending.get(key)
+            if pending is not None:
+                if priority < pending.priority:
+                    # 已排队的后台请求被交互请求提升优先级
+                    pending.priority = priority
+                    heapq.heappush(self._queue, (priority, next(self._seq), pending))
+                return pending.future
+            pending = _Pending(symbol, period, interval, priority)
+            self._pending[key] = pending
+            heapq.heappush(self._queue, (priority, next(self._seq), pending))
+            self._cond.notify()
+            return pending.future
+
+    def call(self, fn: Callable, *args, priority: int = INTERACTIVE, **kwargs):
+        """Run any other provider call (news, recommendations, ...) under the same budget."""
+        return self._with_retries(lambda: fn(*args, **kwargs), priority)
+
+    def ticker(self, symbol: str):
+        # 构造 Ticker 不发请求；其属性访问应放在 call() 中执行
+        return self.provider.ticker(symbol)
+
+    # --- 内部实现 ---
+    def _ensure_dispatcher(self):
+        if self._dispatcher is None or not self._dispatcher.is_alive():
+            self._dispatcher = threading.Thread(target=self._run, name="market-data-dispatcher", daemon=True)
+            self._dispatcher.start()
+
+    def _next_batch(self) -> List[_Pending]:
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+        # 等待一个短窗口，让并发请求合并进同一次批量下载
+        time.sleep(self.batch_window)
+        with self._cond:
+            batch = []
+            while self._queue and not batch:
+                _, _, head = heapq.heappop(self._queue)
+                if self._pending.get((head.symbol, head.period, head.interval)) is head:
+                    batch.append(head)
+            if not batch:
+                return batch
+            rest = []
+            for entry in sorted(self._queue):
+                pending = entry[2]
+                if self._pending.get((pending.symbol, pending.period, pending.interval)) is not pending:
+                    continue
+                if (len(batch) < self.max_batch and pending not in batch
+                        and (pending.period, pending.interval) == (head.period, head.interval)):
+                    batch.append(pending)
+                else:
+                    rest.append(entry)
+            self._queue = rest
+            heapq.heapify(self._queue)
+            for pending in batch:
+                del self._pending[(pending.symbol, pending.period, pending.interval)]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                continue
+            self._slots.acquire()
+            self._executor.submit(self._download, batch)
+
+    def _download(self, batch: List[_Pending]):
+        """
+        Fetch a batch symbol by symbol: each future resolves as soon as its
+        frame arrives, and a retry only refetches the symbols still missing.
+        """
+        head = batch[0]
+        remaining = list(batch)
+        try:
+            for attempt in range(self.max_retries + 1):
+                frames = self.provider.download([p.symbol for p in remaining], head.period, head.interval)
+                try:
+                    while remaining:
+                        # 每个代码一次请求、一个令牌，按各自的优先级申请
+                        self.bucket.acquire(remaining[0].priority)
+                        _, frame = next(frames)
+                        remaining.pop(0).future.set_result(frame)
+                    return
+                except RETRYABLE_ERRORS as e:
+                    self._backoff(attempt, e)
+                finally:
+                    frames.close()
+        except Exception as e:
+            for pending in remaining:
+                pending.future.set_exception(e)
+        finally:
+            self._slots.release()
+
+    def _with_retries(self, fn: Callable, priority: int):
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire(priority)
+            try:
+                return fn()
+            except RETRYABLE_ERRORS as e:
+                self._backoff(attempt, e)
+
+    def _backoff(self, attempt: int, error: Exception):
+        """Sleep before the next attempt, or raise MarketDataUnavailable after the last one."""
+        if attempt == self.max_retries:
+            logger.error("Market data request failed after %d attempt(s): %s", attempt + 1, error)
+            raise MarketDataUnavailable(str(error)) from error
+        # 指数退避 + full jitter
+        delay = random.uniform(0, self.backoff * 2 ** attempt)
+        logger.warning("Market data request failed (%s), retrying in %.2fs", error, delay)
+        time.sleep(delay)
+
+
+_scheduler: Optional[FetchScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> FetchScheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            provider = FakeProvider() if MARKET_DATA_PROVIDER == "fake" else YahooProvider()
+            _scheduler = FetchScheduler(provider)
+        return _scheduler
+
+
+def set_scheduler(scheduler: Optional[FetchScheduler]):
+    """Swap the process-wide scheduler, e.g. for one backed by a FakeProvider."""
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = scheduler
@@ -0,0 +1,315 @@
+import os
+import logging
+import sqlite3
+import threading
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import boto3
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+
+from .db import AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, DYNAMODB_ENDPOINT_URL, get_transactions_table
+
+logger = logging.getLogger(__name__)
+
+
+REPLICA_PATH = os.getenv("REPLICA_PATH", "data/transactions.sqlite3")
+REPLICA_SYNC_INTERVAL = float(os.getenv("REPLICA_SYNC_INTERVAL", "5"))
+# 表未开启 DynamoDB Streams 时，退化为定期全量扫描
+REPLICA_RESCAN_INTERVAL = float(os.getenv("REPLICA_RESCAN_INTERVAL", "300"))
+REPLICA_READY_TIMEOUT = float(os.getenv("REPLICA_READY_TIMEOUT", "30"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    id TEXT PRIMARY KEY,
+    symbol TEXT NOT NULL,
+    operation TEXT NOT NULL,
+    num_of_shares REAL NOT NULL,
+    amount REAL NOT NULL,
+    currency TEXT NOT NULL,
+    date TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_symbol_date ON transactions (symbol, date);
+CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions (date);
+CREATE INDEX IF NOT EXISTS idx_transactions_currency_date ON transactions (currency, date);
+CREATE TABLE IF NOT EXISTS stream_shards (
+    shard_id TEXT PRIMARY KEY,
+    sequence_number TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_deserializer = TypeDeserializer()
+
+
+class ReplicaNotReady(Exception):
+    """Raised when the initial load of the replica has not finished in time."""
+
+
+def _row(item: Dict[str, Any]) -> tuple:
+    number = lambda v: float(v) if isinstance(v, Decimal) else v
+    # 经由 /add 写入的 item 中 Operation / Currency 是枚举
+    text = lambda v: str(getattr(v, "value", v))
+    return (
+        item["id"], text(item["Symbol"]).upper(), text(item["Operation"]),
+        number(item["Num_of_Shares"]), number(item["Amount"]),
+        text(item["Currency"]), item["Date"],
+    )
+
+
+def _valid_rows(items: List[Dict[str, Any]]) -> List[tuple]:
+    """Rows for `items`, skipping (and logging) items that miss a field."""
+    rows = []
+    for item in items:
+        try:
+            rows.append(_row(item))
+        except KeyError as e:
+            logger.warning("Replica: skipping transaction %s without field %s", item.get("id"), e)
+    return rows
+
+
+class TransactionsReplica:
+    """
+    Local SQLite copy of `transactions_table` for analytical queries.
+
+    Bootstrapped with one full scan, then kept in sync by tailing the table's
+    DynamoDB Stream (checkpoints stored alongside the data so restarts resume).
+    Without a stream it falls back to a periodic rescan. Writes made through
+    this process are applied immediately via `upsert`, and re-applied if a
+    full scan running at the same time replaces the table.
+    """
+
+    def __init__(self, path: str = REPLICA_PATH):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._iterators: Dict[str, str] = {}
+        # 全量扫描期间经 upsert 写入的行；扫描结果替换全表后需要重新应用
+        self._scan_upserts: Optional[Dict[str, tuple]] = None
+        self._streams = boto3.client('dynamodbstreams',
+                                     aws_access_key_id=AWS_ACCESS_KEY_ID,
+                                     aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+                                     region_name='eu-north-1',
+                                     endpoint_url=DYNAMODB_ENDPOINT_URL)
+
+    # --- 同步 ---
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="transactions-replica", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def _meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def _set_meta(self, key: str, value: str):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def _run(self):
+        table, stream_arn = None, None
+        while not self._stop.is_set():
+            try:
+                if table is None:
+                    # 查询放在重试循环内：瞬时错误不应让同步线程退出
+                    found = get_transactions_table()
+                    stream_arn = found.latest_stream_arn
+                    table = found
+                    if not stream_arn:
+                        logger.warning("transactions_table has no stream enabled; replica falls back to full rescans")
+                if not stream_arn or self._meta("stream_arn") != stream_arn:
+                    # 全量扫描后从流的起点重放：变更按分片顺序应用，upsert/delete 幂等
+                    with self._lock, self._conn:
+                        self._conn.execute("DELETE FROM stream_shards")
+                    self._iterators.clear()
+                    self._full_scan(table)
+                    if stream_arn:
+                        self._set_meta("stream_arn", stream_arn)
+                if stream_arn:
+                    self._apply_stream(stream_arn)
+                self._ready.set()
+            except ClientError as e:
+                code = e.response['Error']['Code']
+                logger.error("Replica sync failed: %s", e.response['Error']['Message'])
+                self._iterators.clear()
+                if code == "TrimmedDataAccessException":
+                    # 检查点超出流保留期，重新全量同步
+                    self._set_meta("stream_arn", "")
+            except Exception as e:
+                logger.error("Replica sync failed: %s", str(e))
+            self._stop.wait(REPLICA_SYNC_INTERVAL if table is None or stream_arn else REPLICA_RESCAN_INTERVAL)
+
+    def _full_scan(self, table):
+        logger.info("Replica: scanning transactions_table...")
+        with self._lock:
+            self._scan_upserts = {}
+        try:
+            items = []
+            response = table.scan()
+            items.extend(response['Items'])
+            while 'LastEvaluatedKey' in response:
+                response = table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
+                items.extend(response['Items'])
+            rows = _valid_rows(items)
+            with self._lock, self._conn:
+                self._conn.execute("DELETE FROM transactions")
+                self._conn.executemany("INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                # 扫描可能没看到这些写入，重新应用以免被清空
+                self._conn.executemany("INSERT OR REPLACE INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                       list(self._scan_upserts.values()))
+        finally:
+            with self._lock:
+                self._scan_upserts = None
+        logger.info("Replica: loaded %d transaction(s).", len(rows))
+
+    def _shards(self, stream_arn: str) -> List[Dict[str, Any]]:
+        shards, kwargs = [], {"StreamArn": stream_arn}
+        while True:
+            description = self._streams.describe_stream(**kwargs)["StreamDescription"]
+            shards.extend(description["Shards"])
+            if "LastEvaluatedShardId" not in description:
+                return shards
+            kwargs["ExclusiveStartShardId"] = description["LastEvaluatedShardId"]
+
+    def _apply_stream(self, stream_arn: str):
+        with self._lock:
+            checkpoints = {r["shard_id"]: r["sequence_number"]
+                           for r in self._conn.execute("SELECT * FROM stream_shards")}
+        shards = self._shards(stream_arn)
+        listed = {s["ShardId"] for s in shards}
+        for shard in shards:
+            shard_id = shard["ShardId"]
+            if checkpoints.get(shard_id) == "DONE":
+                continue
+            parent = shard.get("ParentShardId")
+            if parent in listed and checkpoints.get(parent) != "DONE":
+                # 同一条记录的变更可能跨父子分片，父分片读完后再读子分片
+                continue
+            iterator = self._iterators.pop(shard_id, None)
+            if iterator is None:
+                seq = checkpoints.get(shard_id)
+                kwargs = ({"ShardIteratorType": "AFTER_SEQUENCE_NUMBER", "SequenceNumber": seq} if seq
+                          else {"ShardIteratorType": "TRIM_HORIZON"})
+                iterator = self._streams.get_shard_iterator(
+                    StreamArn=stream_arn, ShardId=shard_id, **kwargs)["ShardIterator"]
+            while iterator:
+                response = self._streams.get_records(ShardIterator=iterator)
+                records = response["Records"]
+                if records:
+                    self._apply_records(records, shard_id, records[-1]["dynamodb"]["SequenceNumber"])
+                iterator = response.get("NextShardIterator")
+                if not records:
+                    break
+            if iterator is None:
+                # 分片已关闭且读完
+                self._save_checkpoint(shard_id, "DONE")
+                checkpoints[shard_id] = "DONE"
+            else:
+                self._iterators[shard_id] = iterator
+
+    def _apply_records(self, records: List[Dict[str, Any]], shard_id: str, seq: str):
+        with self._lock, self._conn:
+            for record in records:
+                data = record["dynamodb"]
+                if record["eventName"] == "REMOVE":
+                    key = {k: _deserializer.deserialize(v) for k, v in data["Keys"].items()}
+                    self._conn.execute("DELETE FROM transactions WHERE id = ?", (key["id"],))
+                else:
+                    item = {k: _deserializer.deserialize(v) for k, v in data["NewImage"].items()}
+                    self._conn.executemany("INSERT OR REPLACE INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                           _valid_rows([item]))
+            self._conn.execute("INSERT OR REPLACE INTO stream_shards (shard_id, sequence_number) VALUES (?, ?)",
+                               (shard_id, seq))
+
+    def _save_checkpoint(self, shard_id: str, seq: str):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO stream_shards (shard_id, sequence_number) VALUES (?, ?)",
+                               (shard_id, seq))
+
+    def upsert(self, item: Dict[str, Any]):
+        row = _row(item)
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?)", row)
+            if self._scan_upserts is not None:
+                self._scan_upserts[row[0]] = row
+
+    # --- 查询 ---
+    @staticmethod
+    def _filters(symbol=None, currency=None, operation=None, start=None, end=None):
+        clauses, params = [], []
+        for column, value in (("symbol", symbol and symbol.upper()), ("currency", currency), ("operation", operation)):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if start:
+            clauses.append("date >= ?")
+            params.append(start)
+        if end:
+            clauses.append("date <= ?")
+            params.append(end)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def _query(self, sql: str, params: list) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(r) for r in self._conn.execute(sql, params)]
+
+    def transactions(self, **filters) -> List[Dict[str, Any]]:
+        where, params = self._filters(**filters)
+        return self._query(
+            "SELECT id, symbol AS Symbol, operation AS Operation, num_of_shares AS Num_of_Shares, "
+            "amount AS Amount, currency AS Currency, date AS Date "
+            f"FROM transactions{where} ORDER BY date, id", params)
+
+    def monthly_invested(self, **filters) -> List[Dict[str, Any]]:
+        where, params = self._filters(**filters)
+        return self._query(
+            "SELECT substr(date, 1, 7) AS month, currency, "
+            "SUM(CASE WHEN operation = 'BUY' THEN amount ELSE 0 END) AS bought, "
+            "SUM(CASE WHEN operation = 'SELL' THEN amount ELSE 0 END) AS sold, "
+            "SUM(CASE WHEN operation = 'BUY' THEN amount ELSE -amount END) AS invested "
+            f"FROM transactions{where} GROUP BY month, currency ORDER BY month, currency", params)
+
+    def turnover_by_symbol(self, **filters) -> List[Dict[str, Any]]:
+        where, params = self._filters(**filters)
+        return self._query(
+            "SELECT symbol, currency, COUNT(*) AS trades, SUM(num_of_shares) AS shares_traded, "
+            "SUM(amount) AS turnover "
+            f"FROM transactions{where} GROUP BY symbol, currency ORDER BY turnover DESC", params)
+
+
+_replica: Optional[TransactionsReplica] = None
+_replica_lock = threading.Lock()
+
+
+def get_replica() -> TransactionsReplica:
+    """Start the replica on first use; waits up to REPLICA_READY_TIMEOUT for the initial load."""
+    global _replica
+    with _replica_lock:
+        if _replica is None:
+            _replica = TransactionsReplica()
+            _replica.start()
+    if not _replica.wait_ready(REPLICA_READY_TIMEOUT):
+        raise ReplicaNotReady("Transactions replica is still loading")
+    return _replica
+
+
+def replica_if_started() -> Optional[TransactionsReplica]:
+    return _replica
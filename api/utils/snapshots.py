@@ -0,0 +1,68 @@
+import os
+import json
+import hashlib
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import pandas as pd
+from fastapi import Response
+
+
+SNAPSHOT_TTL = int(os.getenv("SNAPSHOT_TTL", "300"))
+SNAPSHOT_MAX_ENTRIES = int(os.getenv("SNAPSHOT_MAX_ENTRIES", "1024"))
+
+# key -> (etag, stored_at, payload)
+_snapshots: Dict[str, Tuple[str, float, Any]] = {}
+_lock = threading.Lock()
+
+
+# === 版本号 / ETag ===
+def make_etag(*parts: Any) -> str:
+    """Derive a strong ETag from the inputs a response depends on."""
+    digest = hashlib.sha1(json.dumps(parts, default=str, sort_keys=True).encode("utf-8")).hexdigest()
+    return f'"{digest[:20]}"'
+
+
+def bar_version(df: pd.DataFrame) -> Tuple[str, float, float]:
+    """Identify the latest bar; close/volume are included because today's bar updates intraday."""
+    if df.empty:
+        return ("", 0.0, 0.0)
+    latest = df.iloc[-1]
+    return (str(df.index[-1]), float(latest["Close"]), float(latest["Volume"]))
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # If-None-Match 使用弱比较
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
+
+
+# === 快照缓存 ===
+def get_snapshot(key: str) -> Optional[Tuple[str, Any]]:
+    """Return (etag, payload) for `key` if a snapshot younger than SNAPSHOT_TTL exists."""
+    with _lock:
+        entry = _snapshots.get(key)
+        if entry is None:
+            return None
+        etag, stored_at, payload = entry
+        if time.monotonic() - stored_at > SNAPSHOT_TTL:
+            del _snapshots[key]
+            return None
+        return etag, payload
+
+
+def put_snapshot(key: str, etag: str, payload: Any):
+    with _lock:
+        _snapshots.pop(key, None)
+        _snapshots[key] = (etag, time.monotonic(), payload)
+        while len(_snapshots) > SNAPSHOT_MAX_ENTRIES:
+            _snapshots.pop(next(iter(_snapshots)))
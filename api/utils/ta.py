@@ -1,12 +1,13 @@
 import json
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Optional
 
 import numpy as np
 import pandas as pd
 from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
-import yfinance as yf
 
 from .advice_config import risk_map, rules
+from .market_data import get_scheduler
+from .workers import attach_ohlcv, release, run_cpu_bound, share_ohlcv
 
 
 # === 仓位计算 ===
@@ -18,9 +19,88 @@ def calculate_position(sub_df):
     invested = buys["Amount"].sum() - sells["Amount"].sum()
     return shares, invested
 
-# === 技术指标函数 ===
-def compute_rsi(series, period=14):
-    delta = series.diff()
+def aggregate_holdings(transactions_df: pd.DataFrame) -> Dict[str, List[Dict[str, Any]]]:
+    """按币种汇总每个股票的当前持仓（在进程池中执行）"""
+    results = []
+
+    for symbol, tx_group in transactions_df.groupby("Symbol"):
+        total_shares = 0
+        invested = 0
+        currency = tx_group["Currency"].iloc[0]
+        for operation, ops_df in tx_group.groupby("Operation"):
+            shares = ops_df["Num_of_Shares"].sum()
+            money = ops_df["Amount"].sum()
+            if operation == "BUY":
+                total_shares += shares
+                invested += money
+            else:
+                total_shares -= shares
+                invested -= money
+
+        if total_shares > 0:
+            results.append({"symbol": symbol, "total_shares": int(total_shares), "invested": float(invested), "currency": str(currency)})
+    result_df = pd.DataFrame(results)
+    holdings = {}
+    for currency, holding in result_df.groupby("currency"):
+        holdings[currency] = holding[["symbol", "total_shares", "invested"]].to_dict(orient="records")
+    return holdings
+
+# === 指标依赖图 ===
+# 每个节点声明自己的输入和参数；同一请求内相同 (节点, 参数) 只计算一次。
+# 例如 ma20 与布林中轨共用 sma(20)，ATR 与 ADX 共用 true range。
+INDICATOR_NODES: Dict[str, Dict[str, Any]] = {}
+
+OHLCV_SOURCES = {"open": "Open", "high": "High", "low": "Low", "close": "Close", "volume": "Volume"}
+
+
+def indicator_node(name: str, inputs: Callable[..., List[tuple]] = lambda **params: [], **defaults):
+    """
+    Register a node of the indicator graph.
+
+    `inputs` maps the node's parameters to the (node, params) pairs it depends on;
+    the resolved inputs are passed positionally to the node function, followed by
+    its parameters as keyword arguments.
+    """
+    def register(fn):
+        INDICATOR_NODES[name] = {"fn": fn, "inputs": inputs, "defaults": defaults}
+        return fn
+    return register
+
+
+class IndicatorGraph:
+    """Per-request memo over INDICATOR_NODES for one OHLCV frame."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self._memo: Dict[tuple, Any] = {}
+
+    def get(self, name: str, **params):
+        if name in OHLCV_SOURCES:
+            return self.df[OHLCV_SOURCES[name]]
+        node = INDICATOR_NODES[name]
+        params = {**node["defaults"], **params}
+        key = (name, tuple(sorted(params.items())))
+        if key not in self._memo:
+            values = [self.get(dep, **dep_params) for dep, dep_params in node["inputs"](**params)]
+            self._memo[key] = node["fn"](*values, **params)
+        return self._memo[key]
+
+
+@indicator_node("sma", inputs=lambda source, window: [(source, {})], source="close", window=20)
+def _sma(series, source, window):
+    return series.rolling(window).mean()
+
+@indicator_node("rolling_std", inputs=lambda source, window: [(source, {})], source="close", window=20)
+def _rolling_std(series, source, window):
+    return series.rolling(window).std()
+
+@indicator_node("ema", inputs=lambda span: [("close", {})], span=12)
+def _ema(close, span):
+    return close.ewm(span=span, adjust=False).mean()
+
+@indicator_node("rsi", inputs=lambda period: [("close", {})], period=14)
+def _rsi(close, period):
+    delta = close.diff()
     gain = delta.clip(lower=0)
     loss = -delta.clip(upper=0)
     avg_gain = gain.rolling(period).mean()
@@ -28,75 +108,256 @@ def compute_rsi(series, period=14):
     rs = avg_gain / avg_loss
     return 100 - (100 / (1 + rs))
 
-def compute_macd(series, fast=12, slow=26, signal=9):
-    ema_fast = series.ewm(span=fast, adjust=False).mean()
-    ema_slow = series.ewm(span=slow, adjust=False).mean()
+@indicator_node("macd", inputs=lambda fast, slow, signal: [("ema", {"span": fast}), ("ema", {"span": slow})],
+                fast=12, slow=26, signal=9)
+def _macd(ema_fast, ema_slow, fast, slow, signal):
     macd = ema_fast - ema_slow
     macd_signal = macd.ewm(span=signal, adjust=False).mean()
     return macd, macd_signal
 
-def compute_bollinger_bands(series, window=20, num_std=2):
-    mid = series.rolling(window).mean()
-    std = series.rolling(window).std()
+@indicator_node("boll", inputs=lambda window, num_std: [("sma", {"window": window}), ("rolling_std", {"window": window})],
+                window=20, num_std=2)
+def _boll(mid, std, window, num_std):
     upper = mid + num_std * std
     lower = mid - num_std * std
     return upper, mid, lower
 
-def compute_adx(df: pd.DataFrame, period: int = 14) -> pd.Series:
-    high = df['High']
-    low = df['Low']
-    close = df['Close']
-
-    plus_dm = (high - high.shift(1)).clip(lower=0)
-    minus_dm = (low.shift(1) - low).clip(lower=0)
-
-    tr1 = (high - low)
+@indicator_node("tr", inputs=lambda: [("high", {}), ("low", {}), ("close", {})])
+def _true_range(high, low, close):
+    tr1 = high - low
     tr2 = (high - close.shift(1)).abs()
     tr3 = (low - close.shift(1)).abs()
-    tr = pd.concat([tr1, tr2, tr3], axis=1).max(axis=1)
+    return pd.concat([tr1, tr2, tr3], axis=1).max(axis=1)
 
-    atr = tr.rolling(period).mean()
+@indicator_node("atr", inputs=lambda period: [("tr", {})], period=14)
+def _atr(tr, period):
+    return tr.rolling(window=period).mean()
+
+@indicator_node("adx", inputs=lambda period: [("high", {}), ("low", {}), ("atr", {"period": period})], period=14)
+def _adx(high, low, atr, period):
+    plus_dm = (high - high.shift(1)).clip(lower=0)
+    minus_dm = (low.shift(1) - low).clip(lower=0)
 
     plus_di = 100 * (plus_dm.rolling(period).sum() / atr)
     minus_di = 100 * (minus_dm.rolling(period).sum() / atr)
 
     dx = (abs(plus_di - minus_di) / (plus_di + minus_di)) * 100
-    adx = dx.rolling(period).mean()
-    return adx
+    return dx.rolling(period).mean()
 
-def compute_obv(df: pd.DataFrame) -> pd.Series:
-    obv = [0]
-    close = df['Close']
-    volume = df['Volume']
-
-    for i in range(1, len(df)):
-        if close[i] > close[i - 1]:
-            obv.append(obv[-1] + volume[i])
-        elif close[i] < close[i - 1]:
-            obv.append(obv[-1] - volume[i])
-        else:
-            obv.append(obv[-1])
-    return pd.Series(obv, index=df.index)
+@indicator_node("obv", inputs=lambda: [("close", {}), ("volume", {})])
+def _obv(close, volume):
+    direction = np.sign(close.diff()).fillna(0)
+    return (direction * volume).cumsum()
 
-def compute_atr(df: pd.DataFrame, period: int = 14) -> pd.Series:
-    high = df['High']
-    low = df['Low']
-    close = df['Close']
+@indicator_node("tp", inputs=lambda: [("high", {}), ("low", {}), ("close", {})])
+def _typical_price(high, low, close):
+    return (high + low + close) / 3
 
-    tr1 = high - low
-    tr2 = (high - close.shift(1)).abs()
-    tr3 = (low - close.shift(1)).abs()
+@indicator_node("cci", inputs=lambda period: [("tp", {}), ("sma", {"source": "tp", "window": period})], period=20)
+def _cci(tp, tp_mean, period):
+    mean_dev = tp.rolling(window=period).apply(lambda x: np.mean(np.abs(x - np.mean(x))), raw=True)
+    return (tp - tp_mean) / (0.015 * mean_dev)
+
+@indicator_node("local_supports", inputs=lambda: [("low", {})])
+def _local_supports(low):
+    price_list = low[(low < low.shift(1)) & (low < low.shift(-1))].round(2).astype(int).tolist()
+    return find_supports_by_clustered_range(price_list)
+
+@indicator_node("local_resistances", inputs=lambda: [("high", {})])
+def _local_resistances(high):
+    price_list = high[(high > high.shift(1)) & (high > high.shift(-1))].round(2).astype(int).tolist()
+    return find_supports_by_clustered_range(price_list)
+
+@indicator_node("volume_levels", inputs=lambda: [("close", {}), ("volume", {})])
+def _volume_levels(close, volume):
+    """
+    基于收盘价和成交量计算成交量密集的支撑位和压力位
+    返回3个最强支撑和压力位（成交量最大），按与当前价格的接近程度排序
+    """
+    df = pd.DataFrame({"Close": close, "Volume": volume}).dropna()
+    price = df["Close"]
+    bins = compute_auto_bins(price)
+
+    # 分桶
+    price_bins = np.linspace(price.min(), price.max(), bins + 1)
+    df["price_bin"] = pd.cut(price, bins=price_bins)
+
+    # 累计每个价格区间的成交量
+    volume_by_price = df.groupby("price_bin", observed=False)["Volume"].sum()
+
+    # 计算每个区间中心价格
+    bin_centers = [(b.left + b.right) / 2 for b in volume_by_price.index]
+    volume_by_price.index = bin_centers
+
+    current_price = price.iloc[-1]
+
+    # 分成下方支撑和上方压力
+    lower = volume_by_price[volume_by_price.index < current_price].sort_values(ascending=False)
+    upper = volume_by_price[volume_by_price.index > current_price].sort_values(ascending=False)
+
+    # 按与当前价的接近程度排序
+    support_levels = sorted(lower.head(6).index, key=lambda x: abs(x - current_price))
+    resistance_levels = sorted(upper.head(6).index, key=lambda x: abs(x - current_price))
+
+    return {
+        "support": [round(s, 2) for s in support_levels][:3],
+        "resistance": [round(r, 2) for r in resistance_levels][:3]
+    }
+
+@indicator_node("fibonacci", inputs=lambda: [("high", {}), ("low", {})])
+def _fibonacci(high, low):
+    high_price = high.max()
+    low_price = low.min()
+    diff = high_price - low_price
+    return {
+        level: high_price - diff * ratio
+        for level, ratio in {"0.236": 0.236, "0.382": 0.382, "0.5": 0.5, "0.618": 0.618, "0.786": 0.786}.items()
+    }
+
+
+# === 可选输出 ===
+# 调用方通过 "名称[:参数...]" 选择输出，例如 "rsi:7,rsi:21,boll"；
+# 使用非默认参数时输出字段带上参数后缀，例如 rsi_7。
+INDICATOR_OUTPUTS: Dict[str, Dict[str, Any]] = {}
+
+DEFAULT_INDICATORS = [
+    "rsi", "macd", "ma:5", "ma:10", "ma:20", "boll", "supports",
+    "volume_levels", "adx", "obv", "atr", "cci", "fibonacci",
+]
+
+
+def indicator_output(name: str, warmup: Callable[..., int] = lambda **params: 1, **defaults):
+    """`warmup(**params)` is the number of bars the output needs before its latest value is defined."""
+    def register(fn):
+        INDICATOR_OUTPUTS[name] = {"fn": fn, "defaults": defaults, "warmup": warmup}
+        return fn
+    return register
+
+
+def _suffix(params: Dict[str, Any], defaults: Dict[str, Any]) -> str:
+    if params == defaults:
+        return ""
+    return "_" + "_".join(str(v) for v in params.values())
+
+
+@indicator_output("rsi", warmup=lambda period: period + 1, period=14)
+def _out_rsi(graph, period):
+    return {f"rsi{_suffix({'period': period}, {'period': 14})}": graph.get("rsi", period=period)}
+
+@indicator_output("macd", warmup=lambda fast, slow, signal: max(fast, slow) + signal, fast=12, slow=26, signal=9)
+def _out_macd(graph, fast, slow, signal):
+    suffix = _suffix({"fast": fast, "slow": slow, "signal": signal}, {"fast": 12, "slow": 26, "signal": 9})
+    macd, macd_signal = graph.get("macd", fast=fast, slow=slow, signal=signal)
+    return {f"macd{suffix}": macd, f"macd_signal{suffix}": macd_signal}
+
+@indicator_output("ma", warmup=lambda window: window, window=20)
+def _out_ma(graph, window):
+    return {f"ma{window}": graph.get("sma", window=window)}
+
+@indicator_output("boll", warmup=lambda window, num_std: window, window=20, num_std=2)
+def _out_boll(graph, window, num_std):
+    suffix = _suffix({"window": window, "num_std": num_std}, {"window": 20, "num_std": 2})
+    upper, mid, lower = graph.get("boll", window=window, num_std=num_std)
+    return {f"boll_upper{suffix}": upper, f"boll_lower{suffix}": lower, f"boll_mid{suffix}": mid}
+
+@indicator_output("supports")
+def _out_supports(graph):
+    return {"local_supports": graph.get("local_supports"), "local_resistances": graph.get("local_resistances")}
 
-    tr = pd.concat([tr1, tr2, tr3], axis=1).max(axis=1)
-    atr = tr.rolling(window=period).mean()
-    return atr
+@indicator_output("volume_levels")
+def _out_volume_levels(graph):
+    levels = graph.get("volume_levels")
+    return {"volumn_supports": levels["support"], "volumn_resistances": levels["resistance"]}
+
+@indicator_output("adx", warmup=lambda period: 2 * period, period=14)
+def _out_adx(graph, period):
+    return {f"adx{_suffix({'period': period}, {'period': 14})}": graph.get("adx", period=period)}
+
+@indicator_output("obv")
+def _out_obv(graph):
+    return {"obv": graph.get("obv")}
+
+@indicator_output("atr", warmup=lambda period: period, period=14)
+def _out_atr(graph, period):
+    return {f"atr{_suffix({'period': period}, {'period': 14})}": graph.get("atr", period=period)}
+
+@indicator_output("cci", warmup=lambda period: period, period=20)
+def _out_cci(graph, period):
+    return {f"cci{_suffix({'period': period}, {'period': 20})}": graph.get("cci", period=period)}
+
+@indicator_output("fibonacci")
+def _out_fibonacci(graph):
+    return {"fibonacci": graph.get("fibonacci")}
+
+
+# 其余参数都是窗口 / 周期长度，必须是正整数
+FLOAT_PARAMS = {"num_std"}
+
+
+def _parse_param(name: str, key: str, value: str):
+    try:
+        number = float(value) if key in FLOAT_PARAMS else int(value)
+    except ValueError:
+        kind = "a number" if key in FLOAT_PARAMS else "an integer"
+        raise ValueError(f"Parameter '{key}' of '{name}' must be {kind}, got '{value}'")
+    if not (number > 0 and np.isfinite(number)):
+        raise ValueError(f"Parameter '{key}' of '{name}' must be positive and finite, got '{value}'")
+    return number
+
+
+def parse_indicator_selection(selection: Optional[str]) -> List[tuple]:
+    """
+    Parse "rsi:7,macd,boll:20:2.5" into [(output, params), ...].
+
+    Raises ValueError on unknown outputs, too many parameters or parameters
+    that are not positive (integers, except for num_std).
+    """
+    specs = [s.strip() for s in selection.split(",") if s.strip()] if selection else DEFAULT_INDICATORS
+    parsed = []
+    for spec in specs:
+        name, *args = spec.split(":")
+        name = name.lower()
+        if name not in INDICATOR_OUTPUTS:
+            raise ValueError(f"Unknown indicator '{name}', expected one of {list(INDICATOR_OUTPUTS)}")
+        defaults = INDICATOR_OUTPUTS[name]["defaults"]
+        if len(args) > len(defaults):
+            raise ValueError(f"Indicator '{name}' takes at most {len(defaults)} parameter(s)")
+        params = dict(defaults)
+        params.update({key: _parse_param(name, key, arg) for key, arg in zip(defaults, args)})
+        parsed.append((name, params))
+    return parsed
+
+
+def required_bars(selection: List[tuple]) -> int:
+    """Bars needed for every selected output to have a latest value (at least 2 for the daily change)."""
+    return max([2] + [INDICATOR_OUTPUTS[name]["warmup"](**params) for name, params in selection])
+
+
+def is_default_selection(selection: List[tuple]) -> bool:
+    return selection == parse_indicator_selection(None)
+
+
+# === 技术指标函数 ===
+def compute_rsi(series, period=14):
+    return IndicatorGraph(series.to_frame("Close")).get("rsi", period=period)
+
+def compute_macd(series, fast=12, slow=26, signal=9):
+    return IndicatorGraph(series.to_frame("Close")).get("macd", fast=fast, slow=slow, signal=signal)
+
+def compute_bollinger_bands(series, window=20, num_std=2):
+    return IndicatorGraph(series.to_frame("Close")).get("boll", window=window, num_std=num_std)
+
+def compute_adx(df: pd.DataFrame, period: int = 14) -> pd.Series:
+    return IndicatorGraph(df).get("adx", period=period)
+
+def compute_obv(df: pd.DataFrame) -> pd.Series:
+    return IndicatorGraph(df).get("obv")
+
+def compute_atr(df: pd.DataFrame, period: int = 14) -> pd.Series:
+    return IndicatorGraph(df).get("atr", period=period)
 
 def compute_cci(df: pd.DataFrame, period: int = 20) -> pd.Series:
-    tp = (df['High'] + df['Low'] + df['Close']) / 3  # Typical Price
-    tp_mean = tp.rolling(window=period).mean()
-    mean_dev = tp.rolling(window=period).apply(lambda x: np.mean(np.abs(x - np.mean(x))))
-    cci = (tp - tp_mean) / (0.015 * mean_dev)
-    return cci
+    return IndicatorGraph(df).get("cci", period=period)
 
 def get_dynamic_bin_width(prices: List[float], percent: float = 0.01, min_width: float = 0.2) -> float:
     """
@@ -120,6 +381,9 @@ def find_supports_by_clustered_range(price_list: List[float], top_n: int = 3) ->
     Returns:
         List of support zone center prices (float)
     """
+    if not price_list:
+        # 数据太短，没有局部极值
+        return []
     prices = pd.Series(price_list)
     min_price = prices.min()
     max_price = prices.max()
@@ -128,7 +392,7 @@ def find_supports_by_clustered_range(price_list: List[float], top_n: int = 3) ->
     bucketed = pd.cut(prices, bins=bins)
     
     # Count prices in each bucket and get the centers of top N buckets
-    grouped = prices.groupby(bucketed).count()
+    grouped = prices.groupby(bucketed, observed=False).count()
     top_zones = grouped.sort_values(ascending=False).head(top_n)
 
     # Compute the center price of each bin as support level
@@ -137,16 +401,10 @@ def find_supports_by_clustered_range(price_list: List[float], top_n: int = 3) ->
     return sorted(levels)
 
 def compute_local_supports(df: pd.DataFrame):
-    df["prev_low"] = df["Low"].shift(1)
-    df["next_low"] = df["Low"].shift(-1)
-    price_list = df[(df["Low"] < df["prev_low"]) & (df["Low"] < df["next_low"])]["Low"].round(2).astype(int).tolist()
-    return find_supports_by_clustered_range(price_list)
+    return IndicatorGraph(df).get("local_supports")
 
 def compute_local_resistances(df: pd.DataFrame):
-    df["prev_high"] = df["High"].shift(1)
-    df["next_high"] = df["High"].shift(-1)
-    price_list = df[(df["High"] > df["prev_high"]) & (df["High"] > df["next_high"])]["High"].round(2).astype(int).tolist()
-    return find_supports_by_clustered_range(price_list)
+    return IndicatorGraph(df).get("local_resistances")
 
 def compute_auto_bins(price: pd.Series, min_bin: int = 10, max_bin: int = 50, target_width: float = 1.5) -> int:
     """
@@ -159,50 +417,17 @@ def compute_auto_bins(price: pd.Series, min_bin: int = 10, max_bin: int = 50, ta
     return max(min(bins, max_bin), min_bin)
 
 def compute_volume_based_support_resistance(df: pd.DataFrame, bins: int = 10) -> Dict[str, List[float]]:
-    """
-    基于收盘价和成交量计算成交量密集的支撑位和压力位
-    返回3个最强支撑和压力位（成交量最大），按与当前价格的接近程度排序
-    """
-    df = df.dropna().copy()
-    price = df["Close"]
-    bins = compute_auto_bins(price)
-
-    # 分桶
-    price_bins = np.linspace(price.min(), price.max(), bins + 1)
-    df["price_bin"] = pd.cut(price, bins=price_bins)
-
-    # 累计每个价格区间的成交量
-    volume_by_price = df.groupby("price_bin")["Volume"].sum()
-
-    # 计算每个区间中心价格
-    bin_centers = [(b.left + b.right) / 2 for b in volume_by_price.index]
-    volume_by_price.index = bin_centers
-
-    current_price = price.iloc[-1]
-
-    # 分成下方支撑和上方压力
-    lower = volume_by_price[volume_by_price.index < current_price].sort_values(ascending=False)
-    upper = volume_by_price[volume_by_price.index > current_price].sort_values(ascending=False)
-
-    # 按与当前价的接近程度排序
-    support_levels = sorted(lower.head(6).index, key=lambda x: abs(x - current_price))
-    resistance_levels = sorted(upper.head(6).index, key=lambda x: abs(x - current_price))
-
-    return {
-        "support": [round(s, 2) for s in support_levels][:3],
-        "resistance": [round(r, 2) for r in resistance_levels][:3]
-    }
+    return IndicatorGraph(df).get("volume_levels")
 
 
 # === 抓取最新汇率 ===
 def get_exchange_rate():
-    ticker = yf.Ticker("EURUSD=X")
-    return ticker.history(period="1d").Close.iloc[-1]
+    return get_scheduler().history("EURUSD=X", period="1d").Close.iloc[-1]
 
 # === 抓取最新新闻 ===
 def get_news_for_symbol(ticker):
     analyzer = SentimentIntensityAnalyzer()
-    news_df = pd.DataFrame([news["content"] for news in ticker.news[:10]])[['contentType', 'title', 'summary', 'provider']]
+    news_df = pd.DataFrame([{"id": news["id"], **news["content"]} for news in ticker.news[:10]])[['id', 'contentType', 'title', 'summary', 'provider']]
     news_df['Sentiment'] = news_df.apply(lambda x: analyzer.polarity_scores(x.summary)["compound"], axis=1)
     return news_df
 
@@ -210,92 +435,87 @@ def get_news_for_symbol(ticker):
 def get_upgrade_downgrate(ticker):
     return pd.DataFrame(ticker.recommendations.head().to_dict(orient='records'))[["strongBuy", "buy", "hold", "sell", "strongSell"]].to_dict(orient="records")
 
+# === 指标计算（CPU 密集，在进程池中执行） ===
+def compute_tech_indicators(df: pd.DataFrame, symbol: str, selection: Optional[List[tuple]] = None):
+    """
+    Compute the selected outputs (default: all) on an OHLCV frame.
+
+    Returns the latest value of each output and the full series of the
+    series-valued ones, keyed by upper-cased output name.
+    """
+    graph = IndicatorGraph(df)
+    tech_analysis_indicators = {"close_price": df["Close"].iloc[-1], "symbol": symbol}
+    columns = {}
+    for name, params in selection or parse_indicator_selection(None):
+        for key, value in INDICATOR_OUTPUTS[name]["fn"](graph, **params).items():
+            if isinstance(value, pd.Series):
+                columns[key.upper()] = value.to_numpy()
+                value = value.iloc[-1]
+                # 窗口尚未填满时最新值为 NaN，JSON 中无法表示
+                value = None if pd.isna(value) else value
+            tech_analysis_indicators[key] = value
+    return tech_analysis_indicators, columns
+
+def _tech_analysis_worker(spec: Dict[str, Any], symbol: str, selection: Optional[List[tuple]] = None):
+    df = attach_ohlcv(spec)
+    tech_analysis_indicators, _ = compute_tech_indicators(df, symbol, selection)
+    return tech_analysis_indicators
+
+# === 抓取分析所需数据 ===
+def fetch_analysis_inputs(symbol: str):
+    """Fetch the 6-month daily bars and news the analysis depends on."""
+    scheduler = get_scheduler()
+    df = scheduler.history(symbol, period="6mo", interval="1d")
+    if df.empty:
+        return df, df
+    ticker = scheduler.ticker(symbol)
+    return df, scheduler.call(get_news_for_symbol, ticker=ticker)
+
 # === 主分析函数 ===
-def full_tech_analysis(symbol: str) -> list:
-    ticker = yf.Ticker(symbol)
-    df = ticker.history(period="6mo", interval="1d")
+def full_tech_analysis(symbol: str, df: pd.DataFrame = None, news_df: pd.DataFrame = None,
+                       selection: Optional[List[tuple]] = None) -> list:
+    if df is None:
+        df, news_df = fetch_analysis_inputs(symbol)
     if df.empty:
         return [f"⚠️ 无法获取 {symbol} 的数据，请检查股票代码。"], df, df
 
-    news_df = get_news_for_symbol(ticker=ticker)
-
-    supports = compute_local_supports(df)
-    resistances = compute_local_resistances(df)
-    volumn_supports_and_resistances = compute_volume_based_support_resistance(df)
-    close = df["Close"]
-    df["RSI"] = compute_rsi(close)
-    df["MACD"], df["MACD_SIGNAL"] = compute_macd(close)
-    df["MA5"] = close.rolling(5).mean()
-    df["MA10"] = close.rolling(10).mean()
-    df["MA20"] = close.rolling(20).mean()
-    df["BOLL_UPPER"], df["BOLL_MID"], df["BOLL_LOWER"] = compute_bollinger_bands(close)
-    df['ADX'] = compute_adx(df)
-    df['OBV'] = compute_obv(df)
-    df['ATR'] = compute_atr(df)
-    df['CCI'] = compute_cci(df)
-    latest = df.iloc[-1]
-    close_price = latest["Close"]
-    ma5, ma10, ma20 = latest["MA5"], latest["MA10"], latest["MA20"]
-    rsi, macd, signal = latest["RSI"], latest["MACD"], latest["MACD_SIGNAL"]
-    adx, obv, atr, cci = latest["ADX"], latest["OBV"], latest["ATR"], latest["CCI"]
-    tech_analysis_indicators = {
-        'close_price': close_price,
-        'rsi': rsi,
-        'macd': macd,
-        'macd_signal': signal,
-        'ma5': ma5,
-        'ma10': ma10,
-        'ma20': ma20,
-        'symbol': symbol,
-        'boll_upper': latest["BOLL_UPPER"],
-        'boll_lower': latest["BOLL_LOWER"],
-        'boll_mid': latest["BOLL_MID"],
-        'local_supports': supports,
-        'local_resistances': resistances,
-        'volumn_supports': volumn_supports_and_resistances['support'],
-        'volumn_resistances': volumn_supports_and_resistances['resistance'],
-        'adx': adx,
-        'obv': obv,
-        'atr': atr,
-        'cci': cci,
-        'fibonacci': {}
-    }
-    # === Fibonacci
-    high_price = df["High"].max()
-    low_price = df["Low"].min()
-    diff = high_price - low_price
-    # analysis.append(f"\n📏 斐波那契回撤（高 {high_price:.2f} → 低 {low_price:.2f}）")
-    for level, ratio in {
-        "0.236": 0.236, "0.382": 0.382, "0.5": 0.5, "0.618": 0.618, "0.786": 0.786
-    }.items():
-        price = high_price - diff * ratio
-        tech_analysis_indicators['fibonacci'][level] = price
-        # analysis.append(f"Level {level}: {price:.2f} {flag}")
+    # OHLCV 通过共享内存传给子进程，避免 pickle 整个 DataFrame
+    shm, spec = share_ohlcv(df)
+    try:
+        tech_analysis_indicators = run_cpu_bound(_tech_analysis_worker, spec, symbol, selection)
+    finally:
+        release(shm)
 
     return tech_analysis_indicators, df, news_df
 
-def generate_analysis_report(tech_analysis_indicators: Dict[str, Any]):
+def evaluate_rules(tech_analysis_indicators: Dict[str, Any]) -> List[int]:
+    """返回触发的规则在 rules 中的下标"""
 
     def evaluate_condition(context: Dict[str, Any], expression: str) -> bool:
         try:
             return eval(expression, {}, context)
         except Exception:
             return False
+    return [i for i, rule in enumerate(rules) if evaluate_condition(tech_analysis_indicators, rule["condition"])]
+
+def generate_analysis_report(tech_analysis_indicators: Dict[str, Any], fired: Optional[List[int]] = None):
+    if fired is None:
+        fired = evaluate_rules(tech_analysis_indicators)
     reports = {
         "title": f"📊 分析对象：{tech_analysis_indicators['symbol']}\n",
         "advices": []
     }
-    for rule in rules:
-        if evaluate_condition(tech_analysis_indicators, rule["condition"]):
-            risk = risk_map.get(rule["action"])
-            if risk:
-                report = (
-                    f"📌 建议操作：{rule["action"]}\n"
-                    f"🎯 触发规则：{rule["name"]}\n"
-                    f"📈 分析理由：{rule["reason"]}\n"
-                    f"🏷️ 风险等级：{risk}"
-                )
-                reports['advices'].append(report)
+    for i in fired:
+        rule = rules[i]
+        risk = risk_map.get(rule["action"])
+        if risk:
+            report = (
+                f"📌 建议操作：{rule["action"]}\n"
+                f"🎯 触发规则：{rule["name"]}\n"
+                f"📈 分析理由：{rule["reason"]}\n"
+                f"🏷️ 风险等级：{risk}"
+            )
+            reports['advices'].append(report)
     if not reports["advices"]:
         report = (
             f"📌 建议操作：观察\n"
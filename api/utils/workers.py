@@ -0,0 +1,111 @@
+import os
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+# 0 = 不启用进程池，直接在当前线程中计算
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", str(os.cpu_count() or 1)))
+ANALYSIS_MP_START = os.getenv("ANALYSIS_MP_START", "spawn")
+
+OHLCV_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+# === 进程池 ===
+def get_executor():
+    """Lazily create the shared process pool, or return None when offloading is disabled."""
+    global _executor
+    if ANALYSIS_WORKERS <= 0:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            logger.info("Starting analysis process pool with %d worker(s)", ANALYSIS_WORKERS)
+            _executor = ProcessPoolExecutor(
+                max_workers=ANALYSIS_WORKERS,
+                mp_context=get_context(ANALYSIS_MP_START)
+            )
+        return _executor
+
+
+def _discard_executor(broken: ProcessPoolExecutor):
+    """Drop a broken pool so the next call starts a fresh one."""
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def run_cpu_bound(fn: Callable, *args, **kwargs) -> Any:
+    """
+    Run a CPU-heavy function in the process pool and block until it finishes.
+
+    The caller is a sync route running in Starlette's threadpool; waiting on the
+    future releases the GIL, so I/O-bound requests keep being served meanwhile.
+    Falls back to an inline call when the pool is disabled. If a worker dies
+    (OOM, crash in native code) the pool is replaced and the call retried once
+    on the new pool, then inline.
+    """
+    for _ in range(2):
+        executor = get_executor()
+        if executor is None:
+            break
+        try:
+            return executor.submit(fn, *args, **kwargs).result()
+        except BrokenProcessPool:
+            logger.error("Analysis process pool is broken, restarting it")
+            _discard_executor(executor)
+    return fn(*args, **kwargs)
+
+
+# === 共享内存传递 OHLCV ===
+def share_ohlcv(df: pd.DataFrame) -> Tuple[SharedMemory, Dict[str, Any]]:
+    """
+    Copy the OHLCV columns of `df` into a shared memory block.
+
+    Returns the block (the caller must close and unlink it) and a small picklable
+    spec that a worker passes to `attach_ohlcv` to read the data without the
+    DataFrame being pickled.
+    """
+    values = np.ascontiguousarray(df[OHLCV_COLUMNS].to_numpy(dtype=np.float64))
+    shm = SharedMemory(create=True, size=max(values.nbytes, 1))
+    buffer = np.ndarray(values.shape, dtype=values.dtype, buffer=shm.buf)
+    buffer[:] = values
+    spec = {"name": shm.name, "shape": values.shape, "columns": OHLCV_COLUMNS}
+    return shm, spec
+
+
+def attach_ohlcv(spec: Dict[str, Any]) -> pd.DataFrame:
+    """Rebuild an OHLCV DataFrame (with a RangeIndex) from a shared memory spec."""
+    shm = SharedMemory(name=spec["name"], track=False)
+    try:
+        values = np.ndarray(spec["shape"], dtype=np.float64, buffer=shm.buf).copy()
+    finally:
+        shm.close()
+    return pd.DataFrame(values, columns=spec["columns"])
+
+
+def release(shm: SharedMemory):
+    shm.close()
+    shm.unlink()
+
@@ -0,0 +1,317 @@
+"""
+End-to-end load test of the FastAPI app against local stand-ins.
+
+- Yahoo Finance: FakeProvider (synthetic bars, news and ratings, simulated throttling)
+- DynamoDB: a moto server, or any compatible endpoint (DynamoDB Local)
+- Groq: a fake OpenAI-compatible chat completions server with configurable latency
+
+The app (under uvicorn), moto and the fake LLM each run in their own
+subprocess, so the load generator does not share a GIL with what it
+measures; data files go to a temporary directory.
+
+Usage:
+    pip install -r requirements-dev.txt   # httpx; moto[server] only without --dynamodb-endpoint
+    python -m benchmarks.load_test --concurrency 16 --duration 30 \\
+        --mix tech-analysis=5,tech-analysis-ai=1,history=3,holdings=2,add=1
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+API_KEY = "load-test"
+DEFAULT_MIX = "tech-analysis=5,tech-analysis-ai=1,history=3,holdings=2,add=1"
+DEFAULT_SYMBOLS = "AAPL,MSFT,TSLA,NVDA,AMZN,GOOG,META,NFLX,AMD,INTC"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(process: subprocess.Popen, url: str, name: str, timeout: float = 60):
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while True:
+        if process.poll() is not None:
+            raise SystemExit(f"{name} exited with code {process.returncode}")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            pass
+        if time.monotonic() > deadline:
+            process.terminate()
+            raise SystemExit(f"{name} did not start within {timeout:.0f}s")
+        time.sleep(0.2)
+
+
+def stop(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+# === 假 LLM（OpenAI 兼容） ===
+def serve_fake_llm(port: int, latency: float):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency)
+            body = json.dumps({
+                "id": "chatcmpl-load-test",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": "fake-llm",
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "建议继续观察，等待趋势明确。"},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            }).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    ThreadingHTTPServer(("127.0.0.1", port), Handler).serve_forever()
+
+
+def start_fake_llm(latency: float):
+    port = free_port()
+    process = subprocess.Popen([sys.executable, "-m", "benchmarks.load_test",
+                                "--serve-fake-llm", str(port), "--llm-latency", str(latency)])
+    url = f"http://127.0.0.1:{port}"
+    wait_until_up(process, url, "Fake LLM")
+    return process, url + "/v1"
+
+
+# === 本地 DynamoDB ===
+def start_local_dynamodb(endpoint: str = None):
+    import boto3
+
+    server = None
+    if endpoint is None:
+        try:
+            import moto.server  # noqa: F401
+        except ImportError:
+            raise SystemExit('Install "moto[server]" or pass --dynamodb-endpoint')
+        port = free_port()
+        server = subprocess.Popen([sys.executable, "-m", "moto.server", "-H", "127.0.0.1", "-p", str(port)],
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        endpoint = f"http://127.0.0.1:{port}"
+        wait_until_up(server, endpoint, "moto")
+
+    client = boto3.client("dynamodb", endpoint_url=endpoint, region_name="eu-north-1",
+                          aws_access_key_id="local", aws_secret_access_key="local")
+    if "transactions_table" not in client.list_tables()["TableNames"]:
+        client.create_table(
+            TableName="transactions_table",
+            KeySchema=[{"AttributeName": "id", "KeyType": "HASH"}],
+            AttributeDefinitions=[
+                {"AttributeName": "id", "AttributeType": "S"},
+                {"AttributeName": "Symbol", "AttributeType": "S"},
+            ],
+            GlobalSecondaryIndexes=[{
+                "IndexName": "SymbolIndex",
+                "KeySchema": [{"AttributeName": "Symbol", "KeyType": "HASH"}],
+                "Projection": {"ProjectionType": "ALL"},
+            }],
+            BillingMode="PAY_PER_REQUEST",
+        )
+    return server, endpoint
+
+
+# === 启动应用 ===
+def create_app():
+    """uvicorn factory run in the app subprocess: the real app backed by a FakeProvider."""
+    from api.main import app
+    from api.utils.market_data import FakeProvider, FetchScheduler, set_scheduler
+
+    provider = FakeProvider(max_calls=int(os.environ["LOAD_TEST_YAHOO_LIMIT"]), window=1.0,
+                            latency=float(os.environ["LOAD_TEST_YAHOO_LATENCY"]))
+    # 预算略低于假 Yahoo 的限流阈值；用 --yahoo-budget 调高即可观察限流重试
+    budget = float(os.environ["LOAD_TEST_YAHOO_BUDGET"])
+    set_scheduler(FetchScheduler(provider, rate=budget, burst=max(1, int(budget // 2))))
+    return app
+
+
+def start_app(args, dynamodb_endpoint: str, llm_url: str, data_dir: str):
+    port = free_port()
+    env = dict(os.environ)
+    # db.py / ai.py / auth.py 在导入时读取
+    env.update({
+        "API_KEY": API_KEY,
+        "AWS_ACCESS_KEY_ID": "local",
+        "AWS_SECRET_ACCESS_KEY": "local",
+        "DYNAMODB_ENDPOINT_URL": dynamodb_endpoint,
+        "GROQ_BASE_URL": llm_url,
+        "GROQ_API": "local",
+        "ANALYSIS_WORKERS": str(args.workers),
+        "ANALYSIS_LOG_DIR": os.path.join(data_dir, "analysis_log"),
+        "ALERTS_PATH": os.path.join(data_dir, "alerts.sqlite3"),
+        "REPLICA_PATH": os.path.join(data_dir, "transactions.sqlite3"),
+        "LOAD_TEST_YAHOO_LIMIT": str(args.yahoo_limit),
+        "LOAD_TEST_YAHOO_LATENCY": str(args.yahoo_latency),
+        "LOAD_TEST_YAHOO_BUDGET": str(args.yahoo_budget),
+    })
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.load_test:create_app", "--factory",
+         "--host", "127.0.0.1", "--port", str(port), "--workers", str(args.app_workers), "--log-level", "warning"],
+        env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    wait_until_up(process, base_url + "/", "App")
+    return process, base_url
+
+
+# === 请求构造 ===
+def build_request(route: str, symbols):
+    symbol = random.choice(symbols)
+    if route == "tech-analysis":
+        return "GET", "/api/stock/tech-analysis/", {"api_key": API_KEY, "symbol": symbol}, None
+    if route == "tech-analysis-ai":
+        return "GET", "/api/stock/tech-analysis/", {"api_key": API_KEY, "symbol": symbol, "ai": "true"}, None
+    if route == "history":
+        return "GET", "/api/stock/history/", {"symbol": symbol}, None
+    if route == "holdings":
+        return "GET", "/api/transactions/holdings", {"api_key": API_KEY}, None
+    if route == "add":
+        shares = random.randint(1, 20)
+        payload = {
+            "symbol": symbol, "operation": "BUY", "currency": random.choice(["USD", "EUR"]),
+            "shares": shares, "amount": round(shares * random.uniform(50, 500), 2),
+        }
+        return "POST", "/api/transactions/add", {"api_key": API_KEY}, payload
+    raise ValueError(f"Unknown route '{route}'")
+
+
+def parse_mix(mix: str):
+    routes, weights = [], []
+    for part in mix.split(","):
+        route, weight = part.split("=")
+        build_request(route.strip(), ["X"])  # 校验路由名
+        routes.append(route.strip())
+        weights.append(float(weight))
+    return routes, weights
+
+
+def seed_transactions(base_url: str, symbols, count: int):
+    """Write a few transactions first so /holdings has data to aggregate."""
+    import httpx
+
+    with httpx.Client(base_url=base_url, timeout=60) as client:
+        for _ in range(count):
+            method, path, params, payload = build_request("add", symbols)
+            client.request(method, path, params=params, json=payload)
+
+
+def drive(base_url: str, routes, weights, symbols, concurrency: int, duration: float):
+    import httpx
+
+    results = defaultdict(list)  # route -> [(latency, status)]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        with httpx.Client(base_url=base_url, timeout=60) as client:
+            while time.perf_counter() < deadline:
+                route = random.choices(routes, weights)[0]
+                method, path, params, payload = build_request(route, symbols)
+                start = time.perf_counter()
+                try:
+                    status = client.request(method, path, params=params, json=payload).status_code
+                except httpx.HTTPError:
+                    status = 0
+                latency = time.perf_counter() - start
+                with lock:
+                    results[route].append((latency, status))
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, time.perf_counter() - start
+
+
+def report(results, elapsed: float):
+    print(f"{'route':<18} {'count':>7} {'errors':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    total = 0
+    for route in sorted(results):
+        samples = results[route]
+        latencies = np.array([latency for latency, _ in samples]) * 1000
+        errors = sum(1 for _, status in samples if status == 0 or status >= 400)
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        total += len(samples)
+        print(f"{route:<18} {len(samples):>7} {errors:>7} {len(samples) / elapsed:>8.1f} {p50:>9.1f} {p95:>9.1f} {p99:>9.1f}")
+    print(f"{'total':<18} {total:>7} {'':>7} {total / elapsed:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30, help="seconds of measured traffic")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds of unmeasured traffic first (pool start-up, caches)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="route=weight pairs")
+    parser.add_argument("--symbols", default=DEFAULT_SYMBOLS)
+    parser.add_argument("--seed-transactions", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="ANALYSIS_WORKERS for the app")
+    parser.add_argument("--app-workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--yahoo-latency", type=float, default=0.2, help="seconds per fake Yahoo call")
+    parser.add_argument("--yahoo-limit", type=int, default=20, help="fake Yahoo calls per second before throttling")
+    parser.add_argument("--yahoo-budget", type=float, default=16, help="scheduler token rate (requests per second)")
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="seconds per fake LLM completion")
+    parser.add_argument("--dynamodb-endpoint", default=None, help="use an existing DynamoDB-compatible endpoint")
+    parser.add_argument("--serve-fake-llm", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_fake_llm is not None:
+        # 子进程模式：只运行假 LLM
+        serve_fake_llm(args.serve_fake_llm, args.llm_latency)
+        return
+
+    routes, weights = parse_mix(args.mix)
+    symbols = [s.strip().upper() for s in args.symbols.split(",") if s.strip()]
+
+    llm, llm_url = start_fake_llm(args.llm_latency)
+    moto_server, dynamodb_endpoint = start_local_dynamodb(args.dynamodb_endpoint)
+    data_dir = tempfile.TemporaryDirectory(prefix="load-test-")
+    app, base_url = start_app(args, dynamodb_endpoint, llm_url, data_dir.name)
+    try:
+        seed_transactions(base_url, symbols, args.seed_transactions)
+        if args.warmup:
+            drive(base_url, routes, weights, symbols, args.concurrency, args.warmup)
+        print(f"Driving {base_url} for {args.duration:.0f}s at concurrency {args.concurrency} ({args.mix})")
+        results, elapsed = drive(base_url, routes, weights, symbols, args.concurrency, args.duration)
+        report(results, elapsed)
+    finally:
+        stop(app)
+        data_dir.cleanup()
+        stop(llm)
+        if moto_server is not None:
+            stop(moto_server)
+
+
+if __name__ == "__main__":
+    main()
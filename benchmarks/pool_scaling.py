@@ -0,0 +1,65 @@
+"""
+Measure full_tech_analysis compute throughput as the process pool grows.
+
+Usage:
+    python -m benchmarks.pool_scaling --tasks 200 --bars 250
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+
+from api.utils.ta import _tech_analysis_worker
+from api.utils.workers import release, share_ohlcv
+
+
+def synthetic_ohlcv(bars: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1.5, bars))
+    spread = np.abs(rng.normal(0, 1.0, bars))
+    return pd.DataFrame({
+        "Open": close + rng.normal(0, 0.5, bars),
+        "High": close + spread,
+        "Low": close - spread,
+        "Close": close,
+        "Volume": rng.integers(1_000_000, 5_000_000, bars).astype(float),
+    })
+
+
+def run(workers: int, tasks: int, bars: int) -> float:
+    frames = [synthetic_ohlcv(bars, seed=i) for i in range(tasks)]
+    shared = [share_ohlcv(df) for df in frames]
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+            # 预热：子进程启动与模块导入不计入耗时
+            list(pool.map(_tech_analysis_worker, [shared[0][1]] * workers, ["BENCH"] * workers))
+            start = time.perf_counter()
+            list(pool.map(_tech_analysis_worker, [spec for _, spec in shared], ["BENCH"] * tasks))
+            elapsed = time.perf_counter() - start
+    finally:
+        for shm, _ in shared:
+            release(shm)
+    return tasks / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tasks", type=int, default=200)
+    parser.add_argument("--bars", type=int, default=125, help="~6 months of daily bars")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    baseline = None
+    print(f"{'workers':>8} {'tasks/s':>10} {'speedup':>8}")
+    for workers in range(1, args.max_workers + 1):
+        throughput = run(workers, args.tasks, args.bars)
+        baseline = baseline or throughput
+        print(f"{workers:>8} {throughput:>10.1f} {throughput / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
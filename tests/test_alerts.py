@@ -0,0 +1,104 @@
+import pytest
+
+from api.utils.alerts import AlertBook, AlertStore, MemorySink, _FieldIndex
+
+
+def make_index(*alerts):
+    index = _FieldIndex()
+    for i, (op, threshold) in enumerate(alerts):
+        index.add({"id": f"a{i}", "op": op, "threshold": threshold})
+    return index
+
+
+# === 阈值索引 ===
+def test_crossed_without_previous_value_matches_current_side():
+    index = make_index(("<", 30), ("<", 20), (">", 70), (">", 25))
+
+    assert sorted(index.crossed(None, 28)) == ["a0", "a3"]
+
+
+def test_crossed_only_returns_thresholds_between_prev_and_value():
+    index = make_index(("crosses_below", 30), ("crosses_below", 20), ("crosses_above", 50), ("crosses", 25))
+
+    assert sorted(index.crossed(35, 22)) == ["a0", "a3"]
+    assert sorted(index.crossed(22, 60)) == ["a2", "a3"]
+    assert index.crossed(22, 24) == []
+
+
+def test_crossed_threshold_equal_to_value():
+    index = make_index(("crosses_below", 30), ("crosses_above", 30))
+
+    # 下穿要求跌破阈值；上穿区间包含起点
+    assert index.crossed(35, 30) == []
+    assert index.crossed(30, 31) == ["a1"]
+
+
+def test_removed_alerts_no_longer_match():
+    index = make_index(("<", 30), ("<", 30))
+    index.remove({"id": "a0", "op": "<", "threshold": 30})
+
+    assert index.crossed(None, 10) == ["a1"]
+    assert len(index) == 1
+
+
+# === AlertBook ===
+def test_cross_alerts_need_a_previous_value():
+    sink = MemorySink()
+    book = AlertBook(sink)
+    book.add("aapl", "rsi", "crosses_below", threshold=30)
+    book.add("aapl", "rsi", "<", threshold=30)
+
+    assert [e["op"] for e in book.update("AAPL", {"rsi": 25})] == ["<"]
+    assert book.update("AAPL", {"rsi": 35}) == []
+    assert sorted(e["op"] for e in book.update("AAPL", {"rsi": 28})) == ["<", "crosses_below"]
+    assert len(sink.events) == 3
+
+
+def test_ref_field_alerts_track_the_spread():
+    book = AlertBook(MemorySink())
+    alert = book.add("AAPL", "close_price", "crosses_above", ref_field="boll_upper")
+
+    assert book.update("AAPL", {"close_price": 98, "boll_upper": 100}) == []
+    events = book.update("AAPL", {"close_price": 103, "boll_upper": 101})
+    assert [(e["alert_id"], e["previous"], e["value"]) for e in events] == [(alert["id"], -2, 2)]
+    # 缺少参考字段时不更新
+    assert book.update("AAPL", {"close_price": 90}) == []
+
+
+def test_invalid_alerts_are_rejected():
+    book = AlertBook(MemorySink())
+    with pytest.raises(ValueError):
+        book.add("AAPL", "volume", "<", threshold=1)
+    with pytest.raises(ValueError):
+        book.add("AAPL", "rsi", "<", threshold=1, ref_field="macd")
+
+
+# === 持久化 ===
+def test_alerts_and_last_values_survive_a_restart(tmp_path):
+    store = AlertStore(str(tmp_path / "alerts.sqlite3"), flush_interval=60)
+    book = AlertBook(MemorySink(), store=store)
+    kept = book.add("AAPL", "rsi", "<", threshold=30)
+    dropped = book.add("MSFT", "rsi", ">", threshold=70)
+    book.remove(dropped["id"])
+    assert len(book.update("AAPL", {"rsi": 25})) == 1
+    store.flush()
+
+    restarted = AlertBook(MemorySink(), store=AlertStore(str(tmp_path / "alerts.sqlite3"), flush_interval=60))
+    assert [a["id"] for a in restarted.list()] == [kept["id"]]
+    # 重启后不会重复触发
+    assert restarted.update("AAPL", {"rsi": 25}) == []
+
+
+def test_books_sharing_a_store_see_each_others_alerts(tmp_path):
+    path = str(tmp_path / "alerts.sqlite3")
+    first = AlertBook(MemorySink(), store=AlertStore(path, flush_interval=60))
+    second = AlertBook(MemorySink(), store=AlertStore(path, flush_interval=60))
+
+    alert = first.add("AAPL", "rsi", "<", threshold=30)
+    second.sync()
+    assert len(second.update("AAPL", {"rsi": 25})) == 1
+
+    assert second.remove(alert["id"])
+    first.sync()
+    assert first.list() == []
+    assert first.symbols() == []
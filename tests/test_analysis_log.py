@@ -0,0 +1,97 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from api.utils.analysis_log import TS_COLUMN, AnalysisLog
+
+
+def at(time: str) -> pd.Timestamp:
+    return pd.Timestamp(f"2026-07-01 {time}", tz="UTC")
+
+
+@pytest.fixture
+def log(tmp_path):
+    return AnalysisLog(str(tmp_path))
+
+
+# === 写入 ===
+def test_out_of_order_appends_keep_the_partition_sorted(log, tmp_path):
+    for time, rsi in (("10:00", 40), ("10:05", 45), ("10:01", 50)):
+        log.append("AAPL", {"rsi": rsi}, [], ts=at(time))
+
+    ts = np.fromfile(tmp_path / "AAPL" / "2026-07-01" / TS_COLUMN, dtype="<i8")
+    assert (np.diff(ts) >= 0).all()
+    assert log.series("AAPL", at("10:00"), at("10:10"))["series"]["rsi"] == [40, 45, 50]
+    assert log.series("AAPL", at("10:04"), at("10:06"))["series"]["rsi"] == [45, 50]
+
+
+def test_concurrent_appends_keep_the_partition_sorted(log, tmp_path):
+    threads = [threading.Thread(target=lambda: [log.append("AAPL", {"rsi": 1.0}, []) for _ in range(50)])
+               for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    partition = next((tmp_path / "AAPL").iterdir())
+    ts = np.fromfile(partition / TS_COLUMN, dtype="<i8")
+    assert len(ts) == 200
+    assert (np.diff(ts) >= 0).all()
+
+
+def test_same_inputs_version_is_logged_once(log):
+    assert log.append("AAPL", {"rsi": 40}, [], version="v1", ts=at("10:00"))
+    assert not log.append("AAPL", {"rsi": 40}, [], version="v1", ts=at("10:01"))
+    assert log.append("MSFT", {"rsi": 40}, [], version="v1", ts=at("10:01"))
+    assert log.append("AAPL", {"rsi": 41}, [], version="v2", ts=at("10:02"))
+
+    assert len(log.series("AAPL", at("00:00"), at("23:59"))["timestamps"]) == 2
+
+
+# === 查询 ===
+def test_series_spans_partitions_and_pads_new_fields(log):
+    log.append("AAPL", {"rsi": 40}, [], ts=pd.Timestamp("2026-07-01 10:00", tz="UTC"))
+    log.append("AAPL", {"rsi": 41, "cci": 90}, [], ts=pd.Timestamp("2026-07-02 10:00", tz="UTC"))
+    log.append("AAPL", {"rsi": 42, "cci": 95}, [], ts=pd.Timestamp("2026-07-03 10:00", tz="UTC"))
+
+    result = log.series("AAPL", "2026-07-01", "2026-07-02 23:00")
+    assert result["series"] == {"rsi": [40, 41], "cci": [None, 90]}
+    assert log.series("aapl", "2026-07-03", "2026-07-04", fields=["cci"])["series"] == {"cci": [95]}
+
+
+def test_extras_follow_the_selected_rows(log):
+    log.append("AAPL", {"rsi": 40, "local_supports": [1, 2]}, [], ts=at("10:00"))
+    log.append("AAPL", {"rsi": 41, "local_supports": [3]}, [], ts=at("11:00"))
+
+    result = log.series("AAPL", at("10:30"), at("12:00"), include_extras=True)
+    assert result["extras"] == [{"local_supports": [3]}]
+
+
+def test_advice_changes_report_only_transitions(log):
+    for time, fired in (("10:00", [0]), ("10:01", [0]), ("10:02", [0, 2]), ("10:03", [2])):
+        log.append("AAPL", {"rsi": 50}, fired, ts=at(time))
+
+    events = log.advice_changes("AAPL", at("00:00"), at("23:59"))
+    assert [e["timestamp"] for e in events] == [at(t).isoformat() for t in ("10:00", "10:02", "10:03")]
+    assert len(events[1]["added"]) == 1 and not events[1]["removed"]
+    assert len(events[2]["removed"]) == 1 and not events[2]["added"]
+
+
+# === 校验 ===
+@pytest.mark.parametrize("symbol", ["../etc", "AAPL/x", "", ".."])
+def test_unsafe_symbols_are_rejected(log, symbol):
+    with pytest.raises(ValueError):
+        log.series(symbol, at("00:00"), at("23:59"))
+    with pytest.raises(ValueError):
+        log.append(symbol, {"rsi": 1}, [])
+
+
+def test_unsafe_or_unknown_fields_are_rejected(log):
+    log.append("AAPL", {"rsi": 40}, [], ts=at("10:00"))
+
+    with pytest.raises(ValueError):
+        log.series("AAPL", at("00:00"), at("23:59"), fields=["../rsi"])
+    with pytest.raises(ValueError):
+        log.series("AAPL", at("00:00"), at("23:59"), fields=["macd"])
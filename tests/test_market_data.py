@@ -0,0 +1,168 @@
+import threading
+import time
+
+import pytest
+from yfinance.exceptions import YFRateLimitError
+
+from api.utils.market_data import (
+    BACKGROUND, INTERACTIVE, FakeProvider, FetchScheduler, MarketDataUnavailable, TokenBucket,
+)
+
+
+def make_scheduler(provider, **kwargs):
+    options = dict(rate=1000, burst=100, reserve=0, batch_window=0.1, max_retries=3, backoff=0.01)
+    options.update(kwargs)
+    return FetchScheduler(provider, **options)
+
+
+# === 合并 ===
+def test_concurrent_requests_are_coalesced_into_one_batch():
+    provider = FakeProvider(max_calls=100)
+    scheduler = make_scheduler(provider)
+
+    futures = [scheduler.submit(symbol) for symbol in ("AAPL", "MSFT", "aapl", "TSLA")]
+    frames = [f.result(timeout=5) for f in futures]
+
+    assert len(provider.calls) == 1
+    assert sorted(provider.calls[0]) == ["AAPL", "MSFT", "TSLA"]
+    # 相同的请求共用一个结果
+    assert futures[0] is futures[2]
+    assert all(not df.empty for df in frames)
+
+
+def test_different_periods_are_not_batched_together():
+    provider = FakeProvider(max_calls=100)
+    scheduler = make_scheduler(provider)
+
+    daily = scheduler.submit("AAPL", period="6mo")
+    intraday = scheduler.submit("MSFT", period="1mo")
+    daily.result(timeout=5)
+    intraday.result(timeout=5)
+
+    assert sorted(provider.calls) == [["AAPL"], ["MSFT"]]
+
+
+def test_coalesced_callers_get_their_own_frame():
+    scheduler = make_scheduler(FakeProvider(max_calls=100))
+    frames = []
+    threads = [threading.Thread(target=lambda: frames.append(scheduler.history("AAPL"))) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    frames[0]["RSI"] = 1.0
+    assert "RSI" not in frames[1]
+    assert len(scheduler.provider.calls) == 1
+
+
+def test_batch_futures_resolve_as_their_frame_arrives():
+    provider = FakeProvider(max_calls=100, latency=0.2)
+    scheduler = make_scheduler(provider)
+
+    futures = [scheduler.submit(symbol) for symbol in ("AAPL", "MSFT", "TSLA")]
+    futures[0].result(timeout=5)
+
+    assert not futures[2].done()
+    futures[2].result(timeout=5)
+
+
+# === 优先级 ===
+def test_interactive_request_promotes_queued_background_request():
+    provider = FakeProvider(max_calls=100)
+    scheduler = make_scheduler(provider, max_batch=1, batch_window=0.2)
+
+    first = scheduler.submit("AAPL", priority=BACKGROUND)
+    queued = scheduler.submit("MSFT", priority=BACKGROUND)
+    promoted = scheduler.submit("MSFT", priority=INTERACTIVE)
+    promoted.result(timeout=5)
+    first.result(timeout=5)
+
+    assert promoted is queued
+    assert provider.calls[0] == ["MSFT"]
+
+
+# === 令牌桶 ===
+def test_background_callers_leave_the_reserve_to_interactive_ones():
+    bucket = TokenBucket(rate=0.01, burst=3, reserve=2)
+    bucket.acquire(BACKGROUND)
+
+    waiting = threading.Thread(target=bucket.acquire, args=(BACKGROUND,), daemon=True)
+    waiting.start()
+    waiting.join(0.2)
+    assert waiting.is_alive()
+
+    # 交互请求仍可用完剩余的令牌
+    start = time.monotonic()
+    bucket.acquire(INTERACTIVE)
+    bucket.acquire(INTERACTIVE)
+    assert time.monotonic() - start < 0.1
+
+
+def test_batches_are_charged_one_token_per_symbol():
+    provider = FakeProvider(max_calls=100)
+    scheduler = make_scheduler(provider, rate=0.01, burst=5)
+
+    for future in [scheduler.submit(symbol) for symbol in ("AAPL", "MSFT", "TSLA")]:
+        future.result(timeout=5)
+
+    assert scheduler.bucket.tokens < 3
+
+
+# === 重试 ===
+def test_throttled_calls_are_retried():
+    provider = FakeProvider(max_calls=1, window=0.05)
+    scheduler = make_scheduler(provider, max_retries=10, backoff=0.02)
+
+    scheduler.call(lambda: provider.ticker("AAPL").news)
+    news = scheduler.call(lambda: provider.ticker("AAPL").news)
+
+    assert len(news) == 5
+
+
+def test_throttled_batch_only_refetches_missing_symbols():
+    provider = FakeProvider(max_calls=2, window=0.2)
+    scheduler = make_scheduler(provider, max_retries=10, backoff=0.1)
+
+    futures = [scheduler.submit(symbol) for symbol in ("AAPL", "MSFT", "TSLA")]
+    for future in futures:
+        future.result(timeout=5)
+
+    assert provider.calls[0] == ["AAPL", "MSFT", "TSLA"]
+    assert len(provider.calls) > 1
+    assert all(call == ["TSLA"] for call in provider.calls[1:])
+
+
+def test_rate_limited_yfinance_calls_are_retried():
+    scheduler = make_scheduler(FakeProvider())
+    attempts = []
+
+    def news():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise YFRateLimitError()
+        return ["headline"]
+
+    assert scheduler.call(news) == ["headline"]
+    assert len(attempts) == 2
+
+
+def test_exhausted_retries_raise_market_data_unavailable():
+    provider = FakeProvider(max_calls=0)
+    scheduler = make_scheduler(provider, max_retries=2)
+
+    with pytest.raises(MarketDataUnavailable):
+        scheduler.history("AAPL", timeout=5)
+
+
+def test_other_errors_propagate_without_retry():
+    scheduler = make_scheduler(FakeProvider())
+    attempts = []
+
+    def lookup():
+        attempts.append(1)
+        return {}["missing"]
+
+    with pytest.raises(KeyError):
+        scheduler.call(lookup)
+    assert len(attempts) == 1
@@ -0,0 +1,171 @@
+from decimal import Decimal
+
+import pytest
+from boto3.dynamodb.types import TypeSerializer
+
+from api.utils import replica as replica_module
+from api.utils.replica import TransactionsReplica
+
+STREAM_ARN = "arn:aws:dynamodb:eu-north-1:000000000000:table/transactions_table/stream/1"
+
+_serializer = TypeSerializer()
+
+
+def item(id, symbol="AAPL", shares=1, amount=100, date="2026-07-01"):
+    return {"id": id, "Symbol": symbol, "Operation": "BUY", "Num_of_Shares": Decimal(shares),
+            "Amount": Decimal(amount), "Currency": "EUR", "Date": date}
+
+
+def insert(seq, **fields):
+    new_image = {k: _serializer.serialize(v) for k, v in item(**fields).items()}
+    return {"eventName": "INSERT", "dynamodb": {"NewImage": new_image, "SequenceNumber": str(seq)}}
+
+
+def remove(seq, id):
+    return {"eventName": "REMOVE", "dynamodb": {"Keys": {"id": {"S": id}}, "SequenceNumber": str(seq)}}
+
+
+class FakeTable:
+    def __init__(self, items, stream_arn=STREAM_ARN, page_size=2):
+        self.items = items
+        self.latest_stream_arn = stream_arn
+        self.page_size = page_size
+        self.on_scan = None
+
+    def scan(self, ExclusiveStartKey=None):
+        if self.on_scan:
+            self.on_scan()
+        start = ExclusiveStartKey or 0
+        response = {"Items": self.items[start:start + self.page_size]}
+        if start + self.page_size < len(self.items):
+            response["LastEvaluatedKey"] = start + self.page_size
+        return response
+
+
+class FakeStreams:
+    """Shards as lists of records; closed shards end with a null NextShardIterator."""
+
+    def __init__(self, shards):
+        self.shards = shards
+        self.reads = []
+
+    def describe_stream(self, StreamArn, ExclusiveStartShardId=None):
+        return {"StreamDescription": {"Shards": [
+            {"ShardId": shard_id, **({"ParentShardId": s["parent"]} if s.get("parent") else {})}
+            for shard_id, s in self.shards.items()]}}
+
+    def get_shard_iterator(self, StreamArn, ShardId, ShardIteratorType, SequenceNumber=None):
+        records = self.shards[ShardId]["records"]
+        position = 0
+        if ShardIteratorType == "AFTER_SEQUENCE_NUMBER":
+            position = next(i + 1 for i, r in enumerate(records) if r["dynamodb"]["SequenceNumber"] == SequenceNumber)
+        return {"ShardIterator": (ShardId, position)}
+
+    def get_records(self, ShardIterator):
+        shard_id, position = ShardIterator
+        shard = self.shards[shard_id]
+        records = shard["records"][position:]
+        self.reads.append(shard_id)
+        end = len(shard["records"])
+        return {"Records": records, "NextShardIterator": None if shard.get("closed") else (shard_id, end)}
+
+
+@pytest.fixture
+def replica(tmp_path):
+    return TransactionsReplica(str(tmp_path / "replica.sqlite3"))
+
+
+def ids(replica):
+    return [t["id"] for t in replica.transactions()]
+
+
+# === 全量扫描 ===
+def test_full_scan_skips_malformed_items(replica):
+    broken = item("b")
+    del broken["Amount"]
+    replica._full_scan(FakeTable([item("a"), broken, item("c"), item("d")]))
+
+    assert ids(replica) == ["a", "c", "d"]
+
+
+def test_upserts_during_a_scan_survive_the_table_swap(replica):
+    table = FakeTable([item("a", amount=100)])
+    table.on_scan = lambda: replica.upsert(item("a", amount=250)) or replica.upsert(item("new"))
+    replica._full_scan(table)
+
+    rows = {t["id"]: t["Amount"] for t in replica.transactions()}
+    assert rows == {"a": 250, "new": 100}
+
+
+# === 流同步 ===
+def test_stream_records_are_applied_and_checkpointed(replica):
+    streams = FakeStreams({"s1": {"records": [insert(1, id="a"), insert(2, id="b"), remove(3, id="a")]}})
+    replica._streams = streams
+    replica._apply_stream(STREAM_ARN)
+    assert ids(replica) == ["b"]
+
+    # 丢弃迭代器（如重启后）时从检查点之后继续读
+    streams.shards["s1"]["records"].append(insert(4, id="c", shares=2))
+    replica._iterators.clear()
+    replica._apply_stream(STREAM_ARN)
+    assert ids(replica) == ["b", "c"]
+
+
+def test_malformed_stream_records_do_not_block_the_shard(replica):
+    bad = insert(1, id="bad")
+    del bad["dynamodb"]["NewImage"]["Symbol"]
+    replica._streams = FakeStreams({"s1": {"records": [bad, insert(2, id="a")]}})
+    replica._apply_stream(STREAM_ARN)
+
+    assert ids(replica) == ["a"]
+
+
+def test_child_shard_waits_for_its_parent(replica):
+    streams = FakeStreams({
+        "child": {"parent": "parent", "records": [insert(2, id="a", amount=300)]},
+        "parent": {"records": [insert(1, id="a", amount=100)], "closed": True},
+    })
+    replica._streams = streams
+
+    replica._apply_stream(STREAM_ARN)
+    assert streams.reads == ["parent"]
+    assert replica.transactions()[0]["Amount"] == 100
+
+    replica._apply_stream(STREAM_ARN)
+    assert streams.reads[1:] == ["child", "child"]
+    assert replica.transactions()[0]["Amount"] == 300
+
+
+def test_closed_shards_are_not_read_again(replica):
+    streams = FakeStreams({"s1": {"records": [insert(1, id="a")], "closed": True}})
+    replica._streams = streams
+
+    replica._apply_stream(STREAM_ARN)
+    replica._apply_stream(STREAM_ARN)
+
+    assert streams.reads == ["s1"]
+
+
+# === 同步线程 ===
+def test_sync_thread_survives_a_failed_table_lookup(replica, monkeypatch):
+    table = FakeTable([item("a")])
+    lookups = []
+
+    def get_transactions_table():
+        lookups.append(1)
+        if len(lookups) == 1:
+            raise OSError("connection reset")
+        return table
+
+    monkeypatch.setattr(replica_module, "get_transactions_table", get_transactions_table)
+    monkeypatch.setattr(replica_module, "REPLICA_SYNC_INTERVAL", 0.01)
+    replica._streams = FakeStreams({"s1": {"records": [insert(1, id="b")]}})
+
+    replica.start()
+    try:
+        assert replica.wait_ready(5)
+    finally:
+        replica.stop()
+
+    assert ids(replica) == ["a", "b"]
+    assert replica._meta("stream_arn") == STREAM_ARN
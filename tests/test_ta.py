@@ -0,0 +1,33 @@
+import pytest
+
+from api.utils.market_data import synthetic_history
+from api.utils.ta import compute_tech_indicators, parse_indicator_selection, required_bars
+
+
+# === 指标选择 ===
+@pytest.mark.parametrize("selection", ["ma:-3", "rsi:7.5", "rsi:0", "boll:20:inf", "macd:1:2:3:4", "foo"])
+def test_invalid_selections_are_rejected(selection):
+    with pytest.raises(ValueError):
+        parse_indicator_selection(selection)
+
+
+def test_non_default_parameters_add_a_suffix():
+    indicators, _ = compute_tech_indicators(synthetic_history("AAPL", 60), "AAPL", parse_indicator_selection("rsi:7,boll:10:2.5"))
+
+    assert {"rsi_7", "boll_upper_10_2.5", "boll_mid_10_2.5", "boll_lower_10_2.5"} <= set(indicators)
+
+
+# === 预热长度 ===
+@pytest.mark.parametrize("selection, bars", [("adx", 28), ("adx:7", 14), ("macd", 35), ("rsi", 15), ("ma:50", 50), (None, 35)])
+def test_required_bars_covers_each_output_warmup(selection, bars):
+    assert required_bars(parse_indicator_selection(selection)) == bars
+
+
+@pytest.mark.parametrize("selection", ["adx", "rsi:7", "boll:10", "atr", "cci", None])
+def test_outputs_are_defined_with_required_bars(selection):
+    parsed = parse_indicator_selection(selection)
+    df = synthetic_history("AAPL", required_bars(parsed))
+
+    indicators, _ = compute_tech_indicators(df, "AAPL", parsed)
+
+    assert all(value is not None for value in indicators.values())